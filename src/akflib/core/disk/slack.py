@@ -3,12 +3,16 @@ Various utilities for interacting with slack space on various file systems.
 """
 
 import logging
+import os
 from dataclasses import dataclass
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
 
-from dfvfs.vfs.data_stream import DataStream
 from dfvfs.vfs.file_entry import FileEntry
 
+if TYPE_CHECKING:
+    from dfvfs.vfs.data_stream import DataStream
+
 logger = logging.getLogger(__name__)
 
 
@@ -99,18 +103,26 @@ def analyze_file_slack(
     # Tally up the total space occupied by this file on disk, which is the sum of
     # the size of the file's extents. The file may not occupy the full size of
     # an extent.
+    #
+    # Only the total size and the final extent are needed, so the extents are
+    # reduced as they're yielded rather than collected into a list; the loop
+    # variable is left bound to the final extent once the loop finishes.
+    #
+    # Each extent reported by DFVFS is already a contiguous run of clusters, so
+    # a contiguous file only yields a single extent and this loop is effectively
+    # O(1). Coalescing adjacent runs would not help, either; it changes neither
+    # the total size nor the end of the final extent (and thus the slack offset).
     allocated_size = 0
+    final_extent = None
 
-    # Keep track of the size of the final cluster/extent.
-    final_extent_size = 0
-    final_extent_offset = 0
-
+    data_stream: DataStream
     for data_stream in file_entry.data_streams:
-        assert isinstance(data_stream, DataStream)
-        for extent in data_stream.GetExtents():
-            allocated_size += extent.size
-            final_extent_size = extent.size
-            final_extent_offset = extent.offset
+        for final_extent in data_stream.GetExtents():
+            allocated_size += final_extent.size
+
+    # Get the size and offset of the final cluster/extent.
+    final_extent_size = final_extent.size if final_extent else 0
+    final_extent_offset = final_extent.offset if final_extent else 0
 
     # The slack space is assumed to be the difference between the total occupied
     # size and the actual size of the file.
@@ -128,15 +140,18 @@ def analyze_file_slack(
     # If the allocated size is zero, the file is resident.
     is_resident = allocated_size == 0
 
-    logger.debug(
-        f"File size: {actual_size}, allocated size: {allocated_size}, slack space: {slack_space}."
-    )
-    logger.debug(
-        f"Relative offset of final extent: {final_extent_offset}, size: {final_extent_size}."
-    )
-    logger.debug(
-        f"Absolute offset of final extent: {absolute_offset + final_extent_offset}."
-    )
+    # This is called once per file when scanning a filesystem, so avoid building
+    # the log messages at all unless they'll actually be emitted
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"File size: {actual_size}, allocated size: {allocated_size}, slack space: {slack_space}."
+        )
+        logger.debug(
+            f"Relative offset of final extent: {final_extent_offset}, size: {final_extent_size}."
+        )
+        logger.debug(
+            f"Absolute offset of final extent: {absolute_offset + final_extent_offset}."
+        )
 
     return SlackSpaceMeta(
         actual_size=actual_size,
@@ -152,6 +167,30 @@ def analyze_file_slack(
     )
 
 
+def analyze_files_slack(
+    file_entries: Iterable[FileEntry], absolute_offset: int = 0
+) -> list[SlackSpaceMeta]:
+    """
+    Calculate the slack space for several file entries on the same filesystem.
+
+    This is equivalent to calling `analyze_file_slack` on each file entry in
+    turn. Note that the entries are intentionally analyzed sequentially. All
+    file entries opened from the same filesystem share a single underlying
+    file object for the disk image, which DFVFS does not guarantee to be safe
+    for concurrent reads; additionally, most extent information is already in
+    memory once the file entry has been opened, so there is little I/O to overlap.
+
+    :param file_entries: The DFVFS file entries to analyze. These should all
+        belong to the same filesystem.
+    :param absolute_offset: The absolute offset of the filesystem on a raw disk
+        image. See `analyze_file_slack`.
+    :return: A list of `SlackSpaceMeta` objects, in the same order as `file_entries`.
+    """
+    return [
+        analyze_file_slack(file_entry, absolute_offset) for file_entry in file_entries
+    ]
+
+
 def insert_into_file_slack(image_path: Path, data: bytes, meta: SlackSpaceMeta) -> None:
     """
     Write data into the slack space of a file contained on a disk image.
@@ -183,9 +222,32 @@ def insert_into_file_slack(image_path: Path, data: bytes, meta: SlackSpaceMeta)
         f"Writing {len(data)} bytes to slack space at offset {meta.slack_space_offset_absolute}."
     )
 
+    # `posix_fadvise` is not available on all platforms (notably Windows)
+    can_fadvise = hasattr(os, "posix_fadvise")
+
     # Open the disk image
     with open(image_path, "r+b") as f:
+        # Only a few bytes are written, so hint to the kernel that it shouldn't
+        # bother reading ahead of the write
+        if can_fadvise:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_RANDOM)
+
         # Seek to the calculated slack space offset
         f.seek(meta.slack_space_offset_absolute)
         # Write the data
         f.write(data)
+
+        # Hint that the pages touched by the write can be evicted from the page
+        # cache, so that repeated writes across large disk images don't push out
+        # more useful pages. This is best-effort: the kernel starts writing back
+        # dirty pages, but only drops the ones that are already clean. Only
+        # whole pages are dropped, so the range is page-aligned.
+        if can_fadvise:
+            f.flush()
+
+            page_size = os.sysconf("SC_PAGE_SIZE")
+            start = meta.slack_space_offset_absolute
+            end = start + len(data)
+            start -= start % page_size
+            end += -end % page_size
+            os.posix_fadvise(f.fileno(), start, end - start, os.POSIX_FADV_DONTNEED)
@@ -2,18 +2,23 @@
 VirtualBox hypervisor bindings for AKF.
 """
 
+import collections
 import datetime
+import functools
 import logging
 import platform
 import shutil
 import subprocess
+import threading
 import time
+from contextlib import contextmanager
 from enum import Enum
 from pathlib import Path
 from types import TracebackType
-from typing import Any
+from typing import IO, Any, Callable, Final, Iterator, cast
 
 import virtualbox
+import virtualbox.events
 import virtualbox.library as vboxlib
 from caselib.uco.core import Bundle
 
@@ -21,6 +26,26 @@ from akflib.core.hypervisor.base import HypervisorABC
 
 logger = logging.getLogger(__name__)
 
+# VirtualBox enumeration values that are checked repeatedly (often in polling
+# loops), bound once here to avoid walking `vboxlib` on every comparison.
+_LOCK_SHARED = vboxlib.LockType.shared
+_MACHINE_RUNNING = vboxlib.MachineState.running
+_MACHINE_POWERED_OFF = vboxlib.MachineState.powered_off
+_ADDITIONS_DESKTOP = vboxlib.AdditionsRunLevelType.desktop
+_ATTACHMENT_HOST_ONLY = vboxlib.NetworkAttachmentType.host_only
+_SESSION_LOCKED = vboxlib.SessionState.locked
+_DEVICE_HARD_DISK = vboxlib.DeviceType.hard_disk
+
+# The interval, in seconds, between checks when polling is unavoidable.
+_POLL_INTERVAL = 0.25
+
+# The longest line of VBoxManage output that will be logged at once. Anything
+# longer is split across several log records.
+_MAX_OUTPUT_LINE_LENGTH = 4096
+# The number of lines of VBoxManage's error output that are kept for logging
+# if it fails. Only the last lines are kept.
+_MAX_ERROR_LINES = 50
+
 
 class VBoxFrontendEnum(str, Enum):
     """
@@ -46,6 +71,14 @@ class VBoxMouseClickEnum(int, Enum):
     MIDDLE_CLICK = 0x04
 
 
+# Plain integer equivalents of `VBoxMouseClickEnum`, for callers issuing large
+# numbers of mouse events that would rather skip the enum lookup entirely.
+MOUSE_RELEASE: Final[int] = 0x00
+MOUSE_LEFT_CLICK: Final[int] = 0x01
+MOUSE_RIGHT_CLICK: Final[int] = 0x02
+MOUSE_MIDDLE_CLICK: Final[int] = 0x04
+
+
 class VBoxExportFormatEnum(str, Enum):
     """
     Supported disk image export formats for the VBoxManage `clonemedium` command.
@@ -66,7 +99,7 @@ class TemporarySession:
         self.session = virtualbox.Session()
         self.machine = machine
 
-        self.machine.lock_machine(self.session, vboxlib.LockType.shared)
+        self.machine.lock_machine(self.session, _LOCK_SHARED)
 
     def __enter__(self) -> virtualbox.Session:
         return self.session
@@ -80,6 +113,94 @@ class TemporarySession:
         self.session.unlock_machine()
 
 
+def _drain_pipe(pipe: IO[bytes], log: Callable[..., None], prefix: str) -> None:
+    """
+    Log each line read from a pipe until it is closed, then close it.
+
+    The pipe is read in binary mode, and each line is only decoded as it's
+    logged. VBoxManage output isn't guaranteed to be valid UTF-8 (e.g. localized
+    messages on Windows), so undecodable bytes are replaced.
+
+    :param pipe: The pipe to read from.
+    :param log: The logging function to pass each line to.
+    :param prefix: A prefix to add to each logged line.
+    """
+    with pipe:
+        while line := pipe.readline(_MAX_OUTPUT_LINE_LENGTH):
+            line = line.rstrip()
+            if line:
+                log("%s: %s", prefix, line.decode(errors="replace"))
+
+
+@functools.lru_cache(maxsize=1)
+def _locate_vboxmanage() -> Path | None:
+    """
+    Find the absolute path to VBoxManage.
+
+    This only depends on the host's filesystem, so the result is cached for
+    the lifetime of the process.
+    """
+    if platform.system() == "Windows":
+        # Find VBoxManage in the default install locations
+        for path in (
+            Path("C:/Program Files/Oracle/VirtualBox/VBoxManage.exe"),
+            Path("C:/Program Files (x86)/Oracle/VirtualBox/VBoxManage.exe"),
+        ):
+            if path.exists():
+                return path.resolve()
+
+    if vbox_path := shutil.which("VBoxManage"):
+        return Path(vbox_path).resolve()
+    return None
+
+
+def _release_medium(medium: vboxlib.IMedium, delete: bool) -> None:
+    """
+    Close a medium created by `VBoxHypervisor`, unregistering it from VirtualBox.
+
+    :param medium: The medium to close.
+    :param delete: If True, the medium's storage (i.e. the image file) is also
+        deleted. This is used to clean up after a failed export.
+    """
+    if delete:
+        logger.info(f"Deleting incomplete disk {medium.id_p=} ({medium.location=})")
+        try:
+            # Deleting the storage also removes the medium from the registry,
+            # unless the deletion fails
+            progress = medium.delete_storage()
+            progress.wait_for_completion(-1)
+            if progress.result_code == 0:
+                return
+            logger.warning("Unable to delete incomplete disk, closing it instead")
+        except vboxlib.VBoxError as e:
+            # This also happens if nothing was ever written to the disk
+            logger.warning(
+                f"Unable to delete incomplete disk, closing it instead ({e})"
+            )
+
+    logger.info(f"Closing/unregistering disk {medium.id_p=} ({medium.location=})")
+    medium.close()
+
+
+# The connection to VirtualBox shared between `VBoxHypervisor` instances, kept
+# separately for each thread. See `_get_shared_vbox()`.
+_thread_vbox = threading.local()
+
+
+def _get_shared_vbox() -> virtualbox.VirtualBox:
+    """
+    Get the connection to VirtualBox shared by all `VBoxHypervisor` instances
+    created in the current thread, creating it if it doesn't exist yet.
+
+    SDK objects are COM/XPCOM proxies bound to the thread that created them,
+    so a connection is never shared across threads.
+    """
+    vbox: virtualbox.VirtualBox | None = getattr(_thread_vbox, "vbox", None)
+    if vbox is None:
+        vbox = _thread_vbox.vbox = virtualbox.VirtualBox()
+    return vbox
+
+
 class VBoxHypervisor(HypervisorABC):
     """
     Concrete implementation of an AKF hypervisor using the VirtualBox SDK.
@@ -98,6 +219,8 @@ class VBoxHypervisor(HypervisorABC):
         self,
         name_or_id: str,
         case_bundle: Bundle | None = None,
+        lazy: bool = True,
+        fresh_connection: bool = False,
     ) -> None:
         """
         Bind this hypervisor instance to a VirtualBox machine by name or UUID.
@@ -105,42 +228,87 @@ class VBoxHypervisor(HypervisorABC):
         Optionally, also bind this hypervisor instance to a CASE bundle.
 
         This *does not* lock the generated VirtualBox session.
+
+        :param name_or_id: The name or UUID of the machine.
+        :param case_bundle: The CASE bundle to associate with this instance.
+        :param lazy: If True, the connection to VirtualBox isn't made (and the
+            machine isn't looked up) until it's first needed. If False, this
+            happens immediately, so an invalid machine raises here instead.
+        :param fresh_connection: If True, this instance creates its own connection
+            to VirtualBox instead of sharing one with other instances created
+            in the same thread.
         """
         # Assign CASE bundle, can be used as needed
         self.case_bundle = case_bundle
 
-        # Get handle to machine, create new session
-        self.vbox = virtualbox.VirtualBox()
-        self.session = virtualbox.Session()
-        self.machine = self.vbox.find_machine(name_or_id)
+        # The handles to VirtualBox, the session, and the machine are created on
+        # first use; see the properties below
+        self._name_or_id = name_or_id
+        self._fresh_connection = fresh_connection
+        if not lazy:
+            self.machine
 
         # Attempt to locate VBoxManage
-        self.vboxmanage = self._locate_vboxmanage()
+        self.vboxmanage = _locate_vboxmanage()
         if self.vboxmanage is None:
             logger.warning("VBoxManage could not be located.")
 
         # Other attributes not set until runtime.
         self.guest_session: vboxlib.IGuestSession | None = None
 
+        # Whether the VM has been observed to be at the desktop since it was
+        # last started. See `_is_ready()`.
+        self._ready: bool = False
+
+        # The slots of the first host-only (True) and non-host-only (False)
+        # adapters, once found. See `_get_adapter()`.
+        self._adapter_slots: dict[bool, int] = {}
+
+        # The IP address of the maintenance interface, once known. See
+        # `get_maintenance_ip()`.
+        self._maintenance_ip: str | None = None
+
         # A dictionary of logical names to remote paths
         self.shared_folders: dict[str, str] = {}
+        # The reverse of `shared_folders`, kept in sync with it
+        self._shared_folders_by_path: dict[str, str] = {}
+        # The logical names of shared folders that have been observed to exist
+        # on the guest since the VM was last started
+        self._verified_shared_folders: set[str] = set()
+
+    @functools.cached_property
+    def vbox(self) -> virtualbox.VirtualBox:
+        """
+        The connection to VirtualBox, obtained on first use.
 
-    def _locate_vboxmanage(self) -> Path | None:
+        Unless `fresh_connection` was set, this is shared with all other
+        instances created in the same thread, since each connection carries its
+        own proxies and event queues with VBoxSVC.
         """
-        Find the absolute path to VBoxManage.
+        if self._fresh_connection:
+            return virtualbox.VirtualBox()
+        return _get_shared_vbox()
+
+    @functools.cached_property
+    def session(self) -> virtualbox.Session:
         """
-        if platform.system() == "Windows":
-            # Find VBoxManage in the default install locations
-            for path in (
-                Path("C:/Program Files/Oracle/VirtualBox/VBoxManage.exe"),
-                Path("C:/Program Files (x86)/Oracle/VirtualBox/VBoxManage.exe"),
-            ):
-                if path.exists():
-                    return path.resolve()
+        The "overall" session for this instance, created on first use.
+        """
+        return virtualbox.Session()
 
-        if vbox_path := shutil.which("VBoxManage"):
-            return Path(vbox_path).resolve()
-        return None
+    @functools.cached_property
+    def machine(self) -> vboxlib.IMachine:
+        """
+        The machine this instance is bound to, looked up on first use.
+        """
+        return self.vbox.find_machine(self._name_or_id)
+
+    @functools.cached_property
+    def _machine_id(self) -> str:
+        """
+        The UUID of the machine. This never changes, so it's only fetched once.
+        """
+        return self.machine.id_p  # type: ignore[no-any-return]
 
     def _call_vboxmanage(
         self, args: list[str], vboxmanage_path: Path | None = None
@@ -159,19 +327,51 @@ class VBoxHypervisor(HypervisorABC):
         if vboxmanage_path is None:
             raise RuntimeError("Path to VBoxManage is not set.")
 
-        # Call VBoxManage
+        # Call VBoxManage. Some commands (e.g. clonemedium) can produce a lot
+        # of output, so it's logged line-by-line as it arrives rather than
+        # buffered in its entirety. Stdout is only ever logged at the debug
+        # level, so don't bother reading it at all if that isn't enabled.
+        #
+        # Stderr is only interesting if VBoxManage fails, so the last few lines
+        # are held onto (undecoded) until the return code is known.
         args = [str(vboxmanage_path)] + args
-        s = subprocess.run(args, capture_output=True)
+        log_stdout = logger.isEnabledFor(logging.DEBUG)
+        proc = subprocess.Popen(
+            args,
+            stdout=subprocess.PIPE if log_stdout else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+
+        # Both pipes have to be drained at the same time; otherwise, VBoxManage
+        # may block on a full stdout pipe while we're waiting on stderr
+        stdout_thread = None
+        if proc.stdout is not None:
+            stdout_thread = threading.Thread(
+                target=_drain_pipe,
+                args=(proc.stdout, logger.debug, "VBoxManage output"),
+                daemon=True,
+            )
+            stdout_thread.start()
+
+        assert proc.stderr is not None
+        stderr: collections.deque[bytes] = collections.deque(maxlen=_MAX_ERROR_LINES)
+        with proc.stderr:
+            while line := proc.stderr.readline(_MAX_OUTPUT_LINE_LENGTH):
+                stderr.append(line)
+
+        if stdout_thread is not None:
+            stdout_thread.join()
 
-        # Log output
-        if s.stdout:
-            logger.debug(f"VBoxManage output: {s.stdout.decode()}")
-        if s.stderr:
-            logger.error(f"VBoxManage error: {s.stderr.decode()}")
+        returncode = proc.wait()
+        if returncode != 0:
+            logger.error("VBoxManage exited with code %d", returncode)
+            for line in stderr:
+                if line := line.rstrip():
+                    logger.error("VBoxManage error: %s", line.decode(errors="replace"))
 
-        return s.returncode == 0
+        return returncode == 0
 
-    def _lock(self, lock_type: vboxlib.LockType = vboxlib.LockType.shared) -> None:
+    def _lock(self, lock_type: vboxlib.LockType = _LOCK_SHARED) -> None:
         """
         Get a lock to the machine associated with this session.
 
@@ -203,10 +403,10 @@ class VBoxHypervisor(HypervisorABC):
         """
         raise RuntimeError("_is_running() is not accurate. Use _is_ready().")
 
-        return bool(self.machine.state == vboxlib.MachineState.running)
+        return bool(self.machine.state == _MACHINE_RUNNING)
 
     def _poll_guest_additions(
-        self, level: vboxlib.AdditionsRunLevelType, timeout: int = 15
+        self, level: vboxlib.AdditionsRunLevelType, timeout: float = 15
     ) -> bool:
         """
         Check if Guest Additions are installed on the VM.
@@ -229,15 +429,22 @@ class VBoxHypervisor(HypervisorABC):
         if timeout <= 0:
             return self.session.console.guest.additions_run_level == level  # type: ignore[no-any-return]
 
-        # Delayed check
-        while timeout > 0:
+        # Delayed check. The level is often reached shortly after polling
+        # starts, so poll quickly at first and back off to avoid hammering the
+        # guest if it's taking a while.
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+
+        while True:
             if self.session.console.guest.additions_run_level == level:
                 return True
 
-            time.sleep(1)
-            timeout -= 1
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
 
-        return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 1.5, 0.5)
 
     def _start_guest_session(
         self, username: str, password: str = "", session_name: str = ""
@@ -245,12 +452,30 @@ class VBoxHypervisor(HypervisorABC):
         """
         Set the username and password for the guest session.
         """
-        self.guest_session = self.session.console.guest.create_session(
-            username,
-            password,
-            "",  # Refers to the unsupported "domain" parameter
-            session_name,
-        )
+        with self._guest_call():
+            self.guest_session = self.session.console.guest.create_session(
+                username,
+                password,
+                "",  # Refers to the unsupported "domain" parameter
+                session_name,
+            )
+
+    @contextmanager
+    def _guest_call(self) -> Iterator[None]:
+        """
+        Wrap a call made through Guest Additions.
+
+        If the call fails, the guest may have shut down or crashed, so the cached
+        result of `_is_ready()` (and the maintenance IP, which is only cached
+        while the VM is ready) is cleared and the guest is checked again the
+        next time a command is issued.
+        """
+        try:
+            yield
+        except vboxlib.VBoxError:
+            self._ready = False
+            self._maintenance_ip = None
+            raise
 
     def _is_ready(self) -> bool:
         """
@@ -258,19 +483,28 @@ class VBoxHypervisor(HypervisorABC):
 
         This is equivalent to checking if the VM is at the desktop (note that
         it might take a little longer than when the desktop first appears).
+
+        Once the VM has reached the desktop, it does not regress during normal
+        operation, so the result is cached. The cached result is only trusted
+        while the machine is still running, since it may have been stopped
+        outside of this instance (e.g. through VBoxManage or the GUI).
         """
+        if self._ready and self.machine.state == _MACHINE_RUNNING:
+            return True
 
-        return bool(
-            self.session.console.guest.additions_run_level
-            == vboxlib.AdditionsRunLevelType.desktop
+        self._ready = (
+            self.session.console.guest.additions_run_level == _ADDITIONS_DESKTOP
         )
+        if not self._ready:
+            self._maintenance_ip = None
+        return self._ready
 
     def start_vm(
         self,
         frontend: VBoxFrontendEnum = VBoxFrontendEnum.GUI,
         environment_changes: list[str] | None = None,
         wait_for_guest_additions: bool = True,
-        guest_additions_timeout: int = 30,
+        guest_additions_timeout: float = 30,
     ) -> bool:
         """
         Start the virtual machine.
@@ -290,6 +524,12 @@ class VBoxHypervisor(HypervisorABC):
         if environment_changes is None:
             environment_changes = []
 
+        # The VM may have been restarted or reconfigured since it was last
+        # seen through this instance
+        self._ready = False
+        self._adapter_slots.clear()
+        self._maintenance_ip = None
+
         future = self.machine.launch_vm_process(
             self.session, frontend.value, environment_changes
         )
@@ -300,35 +540,81 @@ class VBoxHypervisor(HypervisorABC):
                 f"Waiting up to {guest_additions_timeout} seconds for the machine to be ready"
             )
 
-            self._poll_guest_additions(
-                vboxlib.AdditionsRunLevelType.desktop, guest_additions_timeout
-            )
+            self._poll_guest_additions(_ADDITIONS_DESKTOP, guest_additions_timeout)
 
             logger.info("Machine is ready, unblocking")
 
         return True
 
+    def _wait_for_machine_state(
+        self, state: vboxlib.MachineState, timeout: float | None = None
+    ) -> bool:
+        """
+        Block until the machine reaches the specified state.
+
+        :param state: The machine state to wait for.
+        :param timeout: The maximum time, in seconds, to wait for the machine
+            to reach `state`. If `None`, this waits indefinitely.
+        :return: True if the machine reached the state, False if the timeout
+            expired first.
+        """
+        reached = threading.Event()
+        machine_id = self._machine_id
+
+        def on_state_changed(event: vboxlib.IMachineStateChangedEvent) -> None:
+            if event.machine_id == machine_id and event.state == state:
+                reached.set()
+
+        callback_id = self.vbox.register_on_machine_state_changed(on_state_changed)
+
+        try:
+            deadline = None if timeout is None else time.monotonic() + timeout
+
+            # Block on the state change event, but still check the state
+            # directly every so often, since the machine may have reached the
+            # state before the listener was registered
+            while not reached.is_set():
+                if self.machine.state == state:
+                    return True
+
+                wait = _POLL_INTERVAL
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait = min(wait, remaining)
+
+                reached.wait(wait)
+
+            return True
+        finally:
+            virtualbox.events.unregister_callback(callback_id)
+
     def stop_vm(self, force: bool = False) -> bool:
         """
         Stop the virtual machine.
 
-        If `force` is False, this method blocks until VirtualBox reports that
-        the machine state is PoweredOff. If `force` is True, this method returns
-        immediately.
+        In both cases, this method blocks until the machine has actually been
+        powered off.
 
         :param force: If True, the machine is powered off (equivalent to pulling
             the plug). If False, an ACPI shutdown is attempted.
         :return: True if the machine was stopped, False otherwise.
         """
+        self._ready = False
+        self._adapter_slots.clear()
+        self._maintenance_ip = None
+        self._verified_shared_folders.clear()
 
         if force:
-            # Pull the plug
-            self.session.console.power_down()
+            # Pull the plug. This returns an IProgress, which must be waited on
+            # for the power down to actually complete.
+            progress = self.session.console.power_down()
+            progress.wait_for_completion(-1)
         else:
             # ACPI shutdown
             self.session.console.power_button()
-            while self.machine.state != vboxlib.MachineState.powered_off:
-                pass
+            self._wait_for_machine_state(_MACHINE_POWERED_OFF)
 
         return True
 
@@ -336,6 +622,7 @@ class VBoxHypervisor(HypervisorABC):
         self,
         target_vm_name: str,
         output_folder: Path | None = None,
+        use_vboxmanage: bool = False,
     ) -> bool:
         """
         Clone the VM referred to by this instance.
@@ -346,24 +633,67 @@ class VBoxHypervisor(HypervisorABC):
 
         :param target_vm_name: The name of the new VM to create.
         :param output_folder: The folder to save the new VM to. If not set,
-            VBoxManage's default VM folder is used.
+            VirtualBox's default VM folder is used.
+        :param use_vboxmanage: If True, clone the VM by calling VBoxManage instead
+            of through the SDK. This is also done automatically if the installed
+            SDK doesn't support the necessary calls.
         :return: True if the VM was cloned, False otherwise.
         """
-        # IMachine.clone_to() exists, but it's considerably more effort than simply
-        # calling VBoxManage
-
-        logger.info(f"Cloning VM {self.machine.id_p} and creating {target_vm_name}.")
+        logger.info(f"Cloning VM {self._machine_id} and creating {target_vm_name}.")
         logger.info("This will take a while.")
 
+        # Resolved once up front, since the SDK path may fall back to VBoxManage
+        base_folder = (
+            output_folder.resolve().as_posix() if output_folder is not None else ""
+        )
+
+        if not use_vboxmanage:
+            # Cloning in-process avoids starting VBoxManage (and having it connect
+            # to VBoxSVC all over again) just to do the same thing
+            try:
+                settings_file = self.vbox.compose_machine_filename(
+                    target_vm_name, "", "", base_folder
+                )
+                target = self.vbox.create_machine(
+                    settings_file, target_vm_name, [], self.machine.os_type_id, ""
+                )
+            except (AttributeError, TypeError) as e:
+                # The signature of `create_machine()` has changed between
+                # VirtualBox versions
+                logger.warning(
+                    f"Unable to create VM through the SDK, falling back to VBoxManage ({e})"
+                )
+            except vboxlib.VBoxError as e:
+                logger.error(f"Unable to create VM {target_vm_name} ({e})")
+                return False
+            else:
+                try:
+                    progress = self.machine.clone_to(
+                        target, vboxlib.CloneMode.machine_state, []
+                    )
+                    progress.wait_for_completion(-1)
+
+                    result = bool(progress.result_code == 0)
+                    if result:
+                        self.vbox.register_machine(target)
+                except vboxlib.VBoxError as e:
+                    logger.error(f"Unable to clone VM to {target_vm_name} ({e})")
+                    result = False
+
+                logger.info(
+                    f"VM clone operation for {target_vm_name} finished. ({result=})"
+                )
+                return result
+
         args = [
             "clonevm",
-            self.machine.id_p,
+            self._machine_id,
             f"--name={target_vm_name}",
             "--register",
         ]
 
-        if output_folder is not None:
-            args.append(f"--basefolder={output_folder.resolve().as_posix()}")
+        if base_folder:
+            args.append(f"--basefolder={base_folder}")
 
         result = self._call_vboxmanage(args)
         logger.info(f"VM clone operation for {target_vm_name} finished. ({result=})")
@@ -380,19 +710,22 @@ class VBoxHypervisor(HypervisorABC):
         raise NotImplementedError
         # self.session.console.keyboard.put_keys()
 
-    def send_mouse_event(self, x: int, y: int, event: VBoxMouseClickEnum) -> bool:
+    def send_mouse_event(self, x: int, y: int, event: VBoxMouseClickEnum | int) -> bool:
         """
         Issue mouse events to the VM.
 
         :param x: The absolute x-coordinate of the mouse event.
         :param y: The absolute y-coordinate of the mouse event.
-        :param event: The type of mouse event to issue.
+        :param event: The type of mouse event to issue. This may either be a
+            member of `VBoxMouseClickEnum` or one of the `MOUSE_*` constants.
         """
         if not self._is_ready():
             logger.info("Attempted to send mouse event, but VM is not yet ready")
             return False
 
-        self.session.console.mouse.put_mouse_event_absolute(x, y, 0, 0, event.value)
+        # `VBoxMouseClickEnum` members are already ints, so they can be passed
+        # through as-is without going through `.value`
+        self.session.console.mouse.put_mouse_event_absolute(x, y, 0, 0, event)
 
         return True
 
@@ -503,14 +836,18 @@ class VBoxHypervisor(HypervisorABC):
             if self.guest_session is None:
                 raise RuntimeError("Guest session is not set.")
 
-            while not self.guest_session.directory_exists(remote_path, True):
-                pass
+            with self._guest_call():
+                while not self.guest_session.directory_exists(remote_path, True):
+                    time.sleep(_POLL_INTERVAL)
+
+            self._verified_shared_folders.add(logical_name)
 
         self.shared_folders[logical_name] = remote_path
+        self._shared_folders_by_path[remote_path] = logical_name
 
         return True
 
-    def verify_shared_directory(self, name_or_path: str) -> bool:
+    def verify_shared_directory(self, name_or_path: str, force: bool = False) -> bool:
         """
         Check that a shared directory exists on the guest machine.
 
@@ -518,10 +855,16 @@ class VBoxHypervisor(HypervisorABC):
         with that logical name exists. If `name` is a path, this method checks
         that the shared directory at that path exists.
 
+        Shared directories mounted through this instance are remembered once
+        they've been seen on the guest, and aren't checked again unless `force`
+        is set. This is reset when the VM is stopped.
+
         This is equivalent to the VMPOP function `validate_shared_directory()`.
 
         :param name_or_path: The logical name or path of the shared directory to
             verify.
+        :param force: If True, always check the guest, even if the shared
+            directory has previously been seen.
         :return: True if the shared directory exists, False otherwise.
         """
         if not self._is_ready():
@@ -532,15 +875,25 @@ class VBoxHypervisor(HypervisorABC):
             raise RuntimeError("Guest session is not set.")
 
         if name_or_path in self.shared_folders:
-            result = self.guest_session.directory_exists(
-                self.shared_folders[name_or_path]
-            )
-            assert isinstance(result, bool)
+            if not force and name_or_path in self._verified_shared_folders:
+                return True
+
+            with self._guest_call():
+                result = cast(
+                    bool,
+                    self.guest_session.directory_exists(
+                        self.shared_folders[name_or_path]
+                    ),
+                )
+
+            if result:
+                self._verified_shared_folders.add(name_or_path)
+            else:
+                self._verified_shared_folders.discard(name_or_path)
             return result
 
-        result = self.guest_session.directory_exists(name_or_path)
-        assert isinstance(result, bool)
-        return result
+        with self._guest_call():
+            return cast(bool, self.guest_session.directory_exists(name_or_path))
 
     def unmount_shared_directory(self, name_or_path: str) -> bool:
         """
@@ -564,34 +917,71 @@ class VBoxHypervisor(HypervisorABC):
         # TODO: this might not require that the VM is ready, I believe this goes
         # through VirtualBox itself
 
-        # Check if the shared directory exists as a path by reversing the
-        # shared_folders dictionary
-        inverse_shared_folders = {v: k for k, v in self.shared_folders.items()}
-        if name_or_path in inverse_shared_folders:
-            logical_name = inverse_shared_folders[name_or_path]
-        else:
-            logical_name = name_or_path
+        # Check if the shared directory exists as a path
+        logical_name = self._shared_folders_by_path.get(name_or_path, name_or_path)
 
         self.session.machine.remove_shared_folder(logical_name)
         self.session.machine.save_settings()
 
+        if (remote_path := self.shared_folders.pop(logical_name, None)) is not None:
+            self._shared_folders_by_path.pop(remote_path, None)
+        self._verified_shared_folders.discard(logical_name)
+
         return True
 
+    @contextmanager
+    def batch_settings(self) -> Iterator[virtualbox.Session]:
+        """
+        Make several changes to the machine's settings under a single lock.
+
+        The yielded session can be passed to methods that accept a `session`
+        argument (such as `set_bios_time()` and `start_network_capture()`).
+        The machine is locked once on entry, and the settings are saved once
+        on exit, instead of once for each change.
+        """
+        with TemporarySession(self.machine) as session:
+            yield session
+            session.machine.save_settings()
+
+    @contextmanager
+    def _settings_session(
+        self, session: virtualbox.Session | None = None
+    ) -> Iterator[virtualbox.Session]:
+        """
+        Yield a session suitable for changing the machine's settings.
+
+        If `session` is set, it is assumed to have been created by
+        `batch_settings()`, and is yielded as-is; the settings are saved when
+        that batch exits. Otherwise, a new batch is created just for this change.
+        """
+        if session is not None:
+            yield session
+            return
+
+        with self.batch_settings() as session:
+            yield session
+
     def set_bios_time(
-        self, time: datetime.datetime, tz: datetime.tzinfo = datetime.UTC
+        self,
+        time: datetime.datetime,
+        tz: datetime.tzinfo = datetime.UTC,
+        session: virtualbox.Session | None = None,
     ) -> bool:
         """
         Set the BIOS time of the machine to the provided time.
 
         Internally, this method sets the time offset of the machine to the
         difference between the provided time and the host time, in milliseconds.
+
+        :param time: The time to set.
+        :param tz: The timezone of the host, used to calculate the offset.
+        :param session: A session from `batch_settings()`. If not set, a new
+            temporary session is created.
         """
-        # Create and lock temporary shared session
-        with TemporarySession(self.machine) as session:
+        with self._settings_session(session) as session:
             # Calculate millisecond offset between host and guest time, set offset
             time_offset = (time - datetime.datetime.now(tz=tz)).total_seconds() * 1000
             session.machine.bios_settings.time_offset = time_offset
-            session.machine.save_settings()
 
         return True
 
@@ -600,9 +990,10 @@ class VBoxHypervisor(HypervisorABC):
         output_path: Path,
         image_format: VBoxExportFormatEnum,
         disk_uuid: str | None = None,
+        use_vboxmanage: bool = False,
     ) -> bool:
         """
-        Use VBoxManage to create a disk image from the VM's disk.
+        Create a disk image from the VM's disk.
 
         After the disk is created, it is removed from the list of registered
         disks in VirtualBox. This is consistent with the behavior of VMPOP's
@@ -625,20 +1016,27 @@ class VBoxHypervisor(HypervisorABC):
         :param image_format: The format of the disk image to create.
         :param disk_uuid: The UUID of the disk to export. If not set, the largest
             disk attached to the machine is assumed to be the primary disk.
+        :param use_vboxmanage: If True, create the disk image by calling VBoxManage
+            instead of through the SDK.
         :return: True if the disk image was created, False otherwise.
         """
         # Determine disk to export
         if disk_uuid is None:
-            # Iterate through all medium attachments, find largest disk
-            largest_disk_size = 0
-            for attachment in self.machine.medium_attachments:
-                if attachment.medium is None:
-                    continue
+            # Find the largest disk out of all medium attachments. Every property
+            # access is a round-trip to VirtualBox, so each medium's size is only
+            # fetched once, and only for hard disks (optical/floppy media are
+            # never the primary disk).
+            candidates = [
+                (medium.size, medium)
+                for attachment in self.machine.medium_attachments
+                if attachment.type_p == _DEVICE_HARD_DISK
+                and (medium := attachment.medium) is not None
+            ]
+            if not candidates:
+                raise RuntimeError("No disks are attached to the machine.")
 
-                # if attachment.medium.type_p == vboxlib.MediumType.Normal:
-                if attachment.medium.size > largest_disk_size:
-                    disk_uuid = attachment.medium.id_p
-                    largest_disk_size = attachment.medium.size
+            largest_disk_size, largest_disk = max(candidates, key=lambda c: c[0])
+            disk_uuid = largest_disk.id_p
 
             logger.info(
                 f"Exporting disk {disk_uuid} (size: {largest_disk_size}) as primary disk."
@@ -650,13 +1048,53 @@ class VBoxHypervisor(HypervisorABC):
 
         assert disk_uuid is not None
 
+        # Resolving the path hits the filesystem, so only do it once
+        output_location = output_path.resolve().as_posix()
+
+        if not use_vboxmanage:
+            try:
+                source = self.vbox.open_medium(
+                    disk_uuid,
+                    vboxlib.DeviceType.hard_disk,
+                    vboxlib.AccessMode.read_only,
+                    False,
+                )
+                target = self.vbox.create_medium(
+                    image_format.value.upper(),
+                    output_location,
+                    vboxlib.AccessMode.read_write,
+                    vboxlib.DeviceType.hard_disk,
+                )
+            except vboxlib.VBoxError as e:
+                logger.error(f"Unable to set up disk export to {output_location} ({e})")
+                return False
+
+            result = False
+            try:
+                progress = source.clone_to(
+                    target, [vboxlib.MediumVariant.standard], None
+                )
+                progress.wait_for_completion(-1)
+
+                result = bool(progress.result_code == 0)
+            except vboxlib.VBoxError as e:
+                logger.error(f"Unable to export disk {disk_uuid} ({e})")
+            finally:
+                # Close the newly created disk, which removes it from the list of
+                # registered disks in VirtualBox. If the export failed (or was
+                # interrupted), the partially-written image is deleted instead.
+                _release_medium(target, delete=not result)
+
+            logger.info(f"Disk export finished. ({result=})")
+            return result
+
         # Export disk using VBoxManage
         # https://www.virtualbox.org/manual/ch08.html#vboxmanage-clonemedium
         result = self._call_vboxmanage(
             [
                 "clonemedium",
                 disk_uuid,
-                output_path.resolve().as_posix(),
+                output_location,
                 f"--format={image_format.value}",
             ]
         )
@@ -664,14 +1102,24 @@ class VBoxHypervisor(HypervisorABC):
         logger.info(f"Disk export command finished. ({result=})")
 
         # Attempt to close the newly created disk (which removes it from the
-        # list of registered disks in VirtualBox)
-        for disk in reversed(self.vbox.hard_disks):
-            if Path(disk.location).resolve() == output_path.resolve():
+        # list of registered disks in VirtualBox). VirtualBox returns the
+        # already-registered medium when opening it by path, which avoids
+        # searching through every registered disk for a matching location.
+        if result:
+            try:
+                disk = self.vbox.open_medium(
+                    output_location,
+                    vboxlib.DeviceType.hard_disk,
+                    vboxlib.AccessMode.read_only,
+                    False,
+                )
+            except vboxlib.VBoxError as e:
+                logger.warning(f"Unable to find exported disk to close it ({e})")
+            else:
                 logger.info(
                     f"Closing/unregistering disk {disk.id_p=} ({disk.location=})"
                 )
                 disk.close()
-                break
 
         return result
 
@@ -696,8 +1144,15 @@ class VBoxHypervisor(HypervisorABC):
         """
         Get the first non-host-only adapter attached to the VM.
 
+        The slot of the adapter is cached until the VM is stopped, so later
+        calls don't have to check each adapter again.
+
         :param limit: The maximum number of network adapters to check.
+        :param host: If True, get the first host-only adapter instead.
         """
+        if (slot := self._adapter_slots.get(host)) is not None:
+            return self.machine.get_network_adapter(slot)
+
         if host:
             logger.info("Searching for first host-only adapter")
         else:
@@ -707,44 +1162,57 @@ class VBoxHypervisor(HypervisorABC):
 
         for i in range(0, limit):
             adapter = self.machine.get_network_adapter(i)
-            if (
-                host
-                and adapter.attachment_type == vboxlib.NetworkAttachmentType.host_only
-            ):
+            if host and adapter.attachment_type == _ATTACHMENT_HOST_ONLY:
                 logger.info(f"Returning adapter {i} as the host-only adapter")
+                self._adapter_slots[host] = i
                 return adapter
-            elif (
-                not host
-                and adapter.attachment_type != vboxlib.NetworkAttachmentType.host_only
-            ):
+            elif not host and adapter.attachment_type != _ATTACHMENT_HOST_ONLY:
                 logger.info(f"Returning adapter {i} as the non-host-only adapter")
+                self._adapter_slots[host] = i
                 return adapter
 
         return None
 
-    def get_maintenance_ip(self) -> str:
+    def get_maintenance_ip(self, force: bool = False) -> str:
         """
         Get the IP address of the maintenance (RPyC) network interface.
+
+        The address is cached once it has been reported by Guest Additions, for
+        as long as the VM stays ready (see `_is_ready()`). It is cleared when the
+        VM is started or stopped through this instance.
+
+        :param force: If True, always get the address from Guest Additions, even
+            if it has been cached (e.g. if the DHCP lease may have changed).
         """
+        if not force and self._maintenance_ip is not None and self._is_ready():
+            return self._maintenance_ip
+
         adapter = self._get_adapter(host=True)
         if adapter is None:
             raise RuntimeError("No host-only adapter found.")
 
-        ip_prop = self.machine.enumerate_guest_properties(
-            f"/VirtualBox/GuestInfo/Net/{adapter.slot}/V4/IP"
+        host_ip_address = cast(
+            str,
+            self.machine.get_guest_property_value(
+                f"/VirtualBox/GuestInfo/Net/{adapter.slot}/V4/IP"
+            ),
         )
 
-        host_ip_address = ip_prop[1][0]
-        assert isinstance(host_ip_address, str)
+        # An empty string is returned if the property doesn't exist, which is
+        # typically because Guest Additions hasn't reported the address yet
+        if not host_ip_address:
+            raise RuntimeError("The maintenance IP has not been reported by the VM.")
 
         logger.info(f"Maintenance IP is {host_ip_address}")
 
+        self._maintenance_ip = host_ip_address
         return host_ip_address
 
     def start_network_capture(
         self,
         output_path: Path,
         adapter_id: int | None = None,
+        session: virtualbox.Session | None = None,
     ) -> bool:
         """
         Start a network capture on the specified interface.
@@ -754,6 +1222,11 @@ class VBoxHypervisor(HypervisorABC):
         interface).
 
         This method is equivalent to the VMPOP function `start_network_capture()`.
+
+        :param output_path: The path to write the capture to.
+        :param adapter_id: The slot of the adapter to capture traffic on.
+        :param session: A session from `batch_settings()`. If not set, a new
+            temporary session is created.
         """
         # Iterate through all network adapters
         if adapter_id is None:
@@ -764,15 +1237,18 @@ class VBoxHypervisor(HypervisorABC):
 
         logger.info(f"Starting network capture on adapter {adapter_id}")
 
-        with TemporarySession(self.machine) as session:
+        with self._settings_session(session) as session:
             adapter = session.machine.get_network_adapter(adapter_id)
             adapter.trace_enabled = True
             adapter.trace_file = output_path.resolve().as_posix()
-            session.machine.save_settings()
 
         return True
 
-    def stop_network_capture(self, adapter_id: int | None = None) -> bool:
+    def stop_network_capture(
+        self,
+        adapter_id: int | None = None,
+        session: virtualbox.Session | None = None,
+    ) -> bool:
         """
         Stop a network capture on the specified interface.
 
@@ -781,6 +1257,12 @@ class VBoxHypervisor(HypervisorABC):
         interface).
 
         This method is equivalent to the VMPOP function `stop_network_capture()`.
+
+        :param adapter_id: The slot of the adapter to stop capturing traffic on.
+        :param session: A session from `batch_settings()`. If not set, this
+            instance's session is used if it already holds a lock on the machine
+            (e.g. because the VM was started through it); otherwise, a new
+            temporary session is created.
         """
         if adapter_id is None:
             adapter = self._get_adapter(host=False)
@@ -790,9 +1272,17 @@ class VBoxHypervisor(HypervisorABC):
 
         logger.info(f"Stopping network capture on adapter {adapter_id}")
 
-        with TemporarySession(self.machine) as session:
+        # Captures are typically stopped while the VM is still running, in which
+        # case this instance's session usually holds a lock already. There's no
+        # need to take out (and release) a second lock just to flip one setting.
+        if session is None and self.session.state == _SESSION_LOCKED:
+            adapter = self.session.machine.get_network_adapter(adapter_id)
+            adapter.trace_enabled = False
+            self.session.machine.save_settings()
+            return True
+
+        with self._settings_session(session) as session:
             adapter = session.machine.get_network_adapter(adapter_id)
             adapter.trace_enabled = False
-            session.machine.save_settings()
 
         return True
@@ -1,19 +1,36 @@
 import abc
-from typing import Any, ClassVar, Generic, Type, TypeVar
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    ClassVar,
+    Generic,
+    Iterable,
+    Mapping,
+    Type,
+    TypeVar,
+)
 
 # from caselib.uco.core import Bundle
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
-from akflib.core.hypervisor.base import HypervisorABC
-from akflib.rendering.objs import AKFBundle
+# These are only needed for annotations. Importing them pulls in the CASE
+# object model (and, indirectly, the hypervisor modules), which isn't needed
+# just to load and translate a scenario.
+if TYPE_CHECKING:
+    from akflib.core.hypervisor.base import HypervisorABC
+    from akflib.rendering.objs import AKFBundle
 
 
 class AKFModuleArgs(abc.ABC, BaseModel):
     """
     Root for any module argument models.
+
+    Arguments are specific to a single action, so unknown arguments are rejected
+    rather than silently ignored. Parsed arguments are also immutable.
     """
 
-    pass
+    model_config = ConfigDict(frozen=True, extra="forbid")
 
 
 class NullArgs(AKFModuleArgs):
@@ -27,9 +44,12 @@ class NullArgs(AKFModuleArgs):
 class AKFModuleConfig(abc.ABC, BaseModel):
     """
     Root for any module configuration models.
+
+    Unlike arguments, extra keys are allowed (and ignored), since the same global
+    configuration dictionary is passed to every module.
     """
 
-    pass
+    model_config = ConfigDict(frozen=True)
 
 
 class NullConfig(AKFModuleConfig):
@@ -47,6 +67,8 @@ class AKFAction(BaseModel):
     This looks and feels similar to an Ansible task, in large part because it is.
     """
 
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     # The name/description for this action.
     name: str
 
@@ -70,6 +92,8 @@ class AKFScenario(BaseModel):
     The definition for a declarative scenario.
     """
 
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     # The name of the scenario.
     name: str
 
@@ -105,23 +129,47 @@ class AKFScenario(BaseModel):
     actions: list[AKFAction] = []
 
 
-# Note that type variables are not allowed in `ClassVar`, at least for mypy.
-# I believe this use case (for abstract attributes) is valid, but isn't supported.
-# See https://github.com/python/mypy/issues/5144
-ArgsType = TypeVar("ArgsType", bound=AKFModuleArgs)
-ConfigType = TypeVar("ConfigType", bound=AKFModuleConfig)
+@dataclass(slots=True)
+class AKFState:
+    """
+    The state shared between all modules over the course of a single scenario.
 
+    Modules can use this to pass information to modules that run after them.
+    For example, a module that creates a hypervisor object stores it here, so
+    that later modules can act on the same machine.
 
-def check_required_attributes(cls: Type[Any], required_attributes: list[str]) -> None:
+    The same class is used for both execution and translation. During
+    execution, the actual objects are set; during translation, the names of
+    the variables holding those objects in the generated code are set instead.
     """
-    Check that subclasses have required attributes.
-    """
-    for attr in required_attributes:
-        if not hasattr(cls, attr):
-            raise TypeError(
-                f"Can't instantiate abstract class {cls.__name__} "
-                f"without required attribute '{attr}'"
-            )
+
+    # An active HypervisorABC object.
+    hypervisor: "HypervisorABC | None" = None
+    # The name of the currently active hypervisor object.
+    hypervisor_var: str | None = None
+
+    # An AKFBundle object.
+    akf_bundle: "AKFBundle | None" = None
+    # The name of the currently active AKFBundle object.
+    akf_bundle_var: str | None = None
+
+    # The number of levels to indent generated code by. See `auto_format()`.
+    indentation_level: int = 0
+
+    # Any other state that modules may want to share. Keys should be namespaced
+    # by the library that sets them (e.g. `mylib.some_value`).
+    extras: dict[str, Any] = field(default_factory=dict)
+
+
+# Note that type variables are not allowed in `ClassVar`, at least for mypy.
+# I believe this use case (for abstract attributes) is valid, but isn't supported.
+# See https://github.com/python/mypy/issues/5144
+#
+# Models may also be a `TypedDict`, in which case modules receive validated
+# plain dictionaries instead of model instances. (On Python < 3.12, Pydantic
+# requires that these use `typing_extensions.TypedDict`.)
+ArgsType = TypeVar("ArgsType", bound=AKFModuleArgs | Mapping[str, object])
+ConfigType = TypeVar("ConfigType", bound=AKFModuleConfig | Mapping[str, object])
 
 
 class AKFModule(abc.ABC, Generic[ArgsType, ConfigType]):
@@ -142,25 +190,43 @@ class AKFModule(abc.ABC, Generic[ArgsType, ConfigType]):
     # In addition to allowing the module to parse arguments at runtime using
     # this model, it also serves as the "schema" for this module, indicating
     # the expected arguments.
+    #
+    # This is usually an `AKFModuleArgs` subclass, but may also be a `TypedDict`
+    # for modules with simple arguments that don't need a full model instance.
     arg_model: Type[ArgsType]
 
     # The configuration model for this module. This is used to accept and parse
-    # global configuration variables that are accepted by this module.
+    # global configuration variables that are accepted by this module. As with
+    # `arg_model`, this may also be a `TypedDict`.
     config_model: Type[ConfigType]
 
     # The dependencies that must be imported for any code generated by this
-    # module to function.
-    dependencies: ClassVar[set[str]]
+    # module to function. This is shared by every use of the module, so it
+    # should be immutable.
+    dependencies: ClassVar[frozenset[str]]
+
+    # The attributes that every subclass must declare, checked when the subclass
+    # is created.
+    _required_attributes: ClassVar[tuple[str, ...]] = (
+        "aliases",
+        "arg_model",
+        "config_model",
+        "dependencies",
+    )
 
     @staticmethod
     def check_required_attributes(
-        cls: Type[Any], required_attributes: list[str]
+        cls: Type[Any], required_attributes: Iterable[str]
     ) -> None:
         """
         Check that subclasses have required attributes.
         """
-        # Get class annotations
-        annotations = getattr(cls, "__annotations__", {})
+        # Get the annotations declared directly on this class. This is what
+        # `cls.__annotations__` returns anyway, but going through `__dict__`
+        # avoids creating (and storing) an empty annotations dictionary for
+        # every subclass that doesn't declare any.
+        namespace = cls.__dict__
+        annotations = namespace.get("__annotations__", {})
 
         for attr in required_attributes:
             # Check if attribute exists either as a value or as an annotation --
@@ -170,7 +236,14 @@ class AKFModule(abc.ABC, Generic[ArgsType, ConfigType]):
             # In the strictest sense, we could check if the class is abstract
             # or not, but what matters is that you're aware of the attributes
             # to begin with, so we don't make a distinction.
-            if not (hasattr(cls, attr) or attr in annotations):
+            #
+            # Almost every module declares these directly in its class body, so
+            # the class's own namespace is checked first; `hasattr` (which walks
+            # the MRO) is only needed for attributes inherited from a base.
+            if attr in namespace or attr in annotations:
+                continue
+
+            if not hasattr(cls, attr):
                 raise TypeError(
                     f"Can't instantiate abstract class {cls.__name__} "
                     f"without required attribute '{attr}'"
@@ -182,68 +255,47 @@ class AKFModule(abc.ABC, Generic[ArgsType, ConfigType]):
         """
         super().__init_subclass__()
 
-        REQUIRED_ATTRIBUTES = ["aliases", "arg_model", "config_model", "dependencies"]
-        cls.check_required_attributes(cls, REQUIRED_ATTRIBUTES)
+        cls.check_required_attributes(cls, cls._required_attributes)
 
     @staticmethod
-    def get_hypervisor_var(state: dict[str, Any]) -> str | None:
+    def get_hypervisor_var(state: AKFState) -> str | None:
         """
-        Extract the name of the currently specified hypervisor variable from the state
-        dictionary.
+        Extract the name of the currently specified hypervisor variable from the state.
 
         Returns None if the hypervisor variable is not set.
         """
-
-        if result := state.get("akflib.hypervisor_var", None):
-            assert isinstance(result, str)
-
-        return result  # type: ignore[no-any-return]
+        return state.hypervisor_var
 
     @staticmethod
-    def get_hypervisor(state: dict[str, Any]) -> HypervisorABC | None:
+    def get_hypervisor(state: AKFState) -> "HypervisorABC | None":
         """
-        Extract the currently specified hypervisor object from the state dictionary.
+        Extract the currently specified hypervisor object from the state.
 
         Returns None if the hypervisor object is not set.
         """
-        if result := state.get("akflib.hypervisor", None):
-            assert isinstance(result, HypervisorABC)
-
-        return result  # type: ignore[no-any-return]
+        return state.hypervisor
 
     @staticmethod
-    def get_akf_bundle_var(state: dict[str, Any]) -> str | None:
+    def get_akf_bundle_var(state: AKFState) -> str | None:
         """
-        Extract the name of the currently specified AKFBundle variable from the state
-        dictionary.
+        Extract the name of the currently specified AKFBundle variable from the state.
 
         Returns None if the AKFBundle variable name is not set.
         """
-
-        if result := state.get("akflib.akf_bundle_var", None):
-            assert isinstance(result, str)
-
-        return result  # type: ignore[no-any-return]
+        return state.akf_bundle_var
 
     @staticmethod
-    def get_akf_bundle(state: dict[str, Any]) -> AKFBundle | None:
+    def get_akf_bundle(state: AKFState) -> "AKFBundle | None":
         """
-        Extract the currently specified AKFBundle variable from the state
-        dictionary.
+        Extract the currently specified AKFBundle variable from the state.
 
         Returns None if the AKFBundle variable is not set.
         """
-
-        if result := state.get("akflib.akf_bundle", None):
-            assert isinstance(result, AKFBundle)
-
-        return result  # type: ignore[no-any-return]
+        return state.akf_bundle
 
     @classmethod
     @abc.abstractmethod
-    def generate_code(
-        cls, args: ArgsType, config: ConfigType, state: dict[str, Any]
-    ) -> str:
+    def generate_code(cls, args: ArgsType, config: ConfigType, state: AKFState) -> str:
         """
         Generate the code necessary to execute this module from the imperative
         paradigm (that is, a typical Python script).
@@ -254,7 +306,7 @@ class AKFModule(abc.ABC, Generic[ArgsType, ConfigType]):
 
         Code returned as a result of this function should contain a trailing newline.
 
-        Additionally, it receives a state dictionary that can be used to modify
+        Additionally, it receives a state object that can be used to modify
         the output of the code. For example, if a related module sets a state
         variable that indicates it is inside a `with` block, this module can
         indent and use the context manager accordingly.
@@ -267,7 +319,7 @@ class AKFModule(abc.ABC, Generic[ArgsType, ConfigType]):
         cls,
         args: ArgsType,
         config: ConfigType,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> None:
         """
         Execute the code generated by this module.
@@ -1,24 +1,31 @@
 """
 Entrypoint for the declarative translator.
 
-From akflib, the following state variables can be expected:
-
-- akflib.hypervisor: An active HypervisorABC object.
-- akflib.hypervisor_var: The name of the currently active hypervisor object.
-- akflib.akf_bundle: An AKFBundle object.
+The state shared between modules is described by `AKFState`.
 """
 
+import ast
+import functools
 import logging
+import os
 import random
 import sys
+from itertools import chain
 from pathlib import Path
-from typing import Any, Iterable, Type
+from typing import IO, Any, Iterable, Mapping, Type
 
 import click
-from pydantic import ValidationError
-from pydantic_yaml import parse_yaml_file_as
-
-from akflib.declarative.core import AKFModule, AKFScenario
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from ruamel.yaml import YAML
+
+from akflib.declarative.core import (
+    AKFAction,
+    AKFModule,
+    AKFScenario,
+    AKFState,
+    NullArgs,
+    NullConfig,
+)
 from akflib.declarative.util import (
     align_text,
     get_all_module_classes,
@@ -35,34 +42,110 @@ logging.basicConfig(
 )
 logger = logging.getLogger()
 
+# The fixed blocks of code at the top of every translated scenario
+# fmt: off
+_TRANSLATION_HEADER = align_text('''
+    """
+    This file was automatically generated by akf-translate.
+    
+    Verify that the generated code is correct before running it.
+    """
+''') + "\n\n"
+# fmt: on
+
+# fmt: off
+_LOGGING_SETUP = align_text('''
+    # Set up logging
+    logging.basicConfig(
+        handlers=[logging.StreamHandler(sys.stdout)],
+        level=logging.INFO,
+        format="%(filename)s:%(lineno)d | %(asctime)s | [%(levelname)s] - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    logger = logging.getLogger()
+''') + "\n\n"
+# fmt: on
+
+
+@functools.lru_cache(maxsize=None)
+def generate_import_statement(import_path: str) -> str:
+    """
+    Generate the import statement for a single dotted path.
+
+    Module dependencies are declared once per class, but the same paths show up
+    over and over again across actions (and scenarios), so each path is only
+    rendered once.
+
+    The statement is built as an AST node and unparsed, rather than formatted
+    by hand, so that the result is always valid Python.
+    """
+    node: ast.stmt
+    if "." not in import_path:
+        node = ast.Import(names=[ast.alias(name=import_path)])
+    else:
+        module, name = import_path.rsplit(".", 1)
+        node = ast.ImportFrom(module=module, names=[ast.alias(name=name)], level=0)
+
+    return ast.unparse(node)
+
 
 def generate_import_statements(import_paths: Iterable[str]) -> str:
     # Note that this doesn't group import statements together or do anything
     # fancy like that
-    import_statements = []
-    for path in import_paths:
-        parts = path.split(".")
-        if len(parts) == 1:
-            import_statements.append(f"import {path}")
-        else:
-            module = ".".join(parts[:-1])
-            name = parts[-1]
-            import_statements.append(f"from {module} import {name}")
-
-    # Remove duplicate import statements
-    import_statements = list(set(import_statements))
+    import_statements = {generate_import_statement(path) for path in import_paths}
 
     # Sort import statements alphabetically
-    import_statements.sort()
+    return "\n".join(sorted(import_statements))
+
+
+def load_scenario(input_file: str | Path) -> AKFScenario:
+    """
+    Load and validate a scenario file.
+
+    YAML is the expected format, but JSON scenario files are validated directly
+    by Pydantic without going through a YAML parser at all.
 
-    return "\n".join(import_statements)
+    YAML files are loaded with ruamel.yaml's safe loader, which uses the libyaml
+    C extension when it's available instead of the pure-Python parser. Scalars
+    are still resolved using YAML 1.2 rules.
 
+    :param input_file: The path to the scenario file.
+    :raises ValidationError: If the file is not a valid scenario.
+    :return: The loaded scenario.
+    """
+    input_path = Path(input_file)
+
+    if input_path.suffix.lower() == ".json":
+        return AKFScenario.model_validate_json(input_path.read_bytes())
+
+    with input_path.open("rb") as f:
+        return AKFScenario.model_validate(YAML(typ="safe").load(f))
 
-def build_module_cache(libraries: list[str]) -> dict[str, Type[AKFModule[Any, Any]]]:
+
+def build_module_cache(
+    libraries: Iterable[str],
+) -> dict[str, Type[AKFModule[Any, Any]]]:
     """
     Build a cache of all AKFModules in the specified libraries.
 
     Where applicable, this also generates mappings for aliases.
+
+    The cache is only built once for each (ordered) set of libraries, since
+    it requires walking and importing every module in each library. A new
+    dictionary is returned on every call, so callers may modify it.
+    """
+    return dict(_build_module_cache(tuple(libraries)))
+
+
+@functools.lru_cache(maxsize=None)
+def _build_module_cache(
+    libraries: tuple[str, ...],
+) -> dict[str, Type[AKFModule[Any, Any]]]:
+    """
+    Implementation of `build_module_cache()`, cached by library list.
+
+    Note that the order of `libraries` matters, since duplicate names are
+    resolved in favor of earlier libraries.
     """
 
     def add_to_cache(
@@ -80,10 +163,9 @@ def build_module_cache(libraries: list[str]) -> dict[str, Type[AKFModule[Any, An
         cache[name] = obj
 
     # Start by getting all module classes from each library.
-    module_classes = []
-    for library in libraries:
-        # Get all module classes in the library
-        module_classes += get_all_module_classes(library)
+    module_classes = list(
+        chain.from_iterable(get_all_module_classes(library) for library in libraries)
+    )
 
     # Then, build a cache of their fully qualified names.
     module_cache: dict[str, Type[AKFModule[Any, Any]]] = {}
@@ -96,17 +178,16 @@ def build_module_cache(libraries: list[str]) -> dict[str, Type[AKFModule[Any, An
 
         # Also add aliases if they exist
         if hasattr(module_class, "aliases"):
+            # Aliases can also be qualified by substituting the final component
+            # of the fully qualified name with the alias
+            module_prefix = module_class.__module__
+
             for alias in module_class.aliases:
                 # Add the "base", unqualified alias
                 add_to_cache(alias, module_class, module_cache)
 
-                # Then, take the fully qualified name and substitute the final
-                # component with the alias
-                alias_parts = module_name.split(".")
-                alias_parts[-1] = alias
-                alias_name = ".".join(alias_parts)
-
-                add_to_cache(alias_name, module_class, module_cache)
+                # Then, add the qualified alias
+                add_to_cache(f"{module_prefix}.{alias}", module_class, module_cache)
 
     return module_cache
 
@@ -119,25 +200,27 @@ def get_akf_modules(
     Attempt to import a set of AKFModules identified by their fully-qualified
     module paths.
 
-    TODO: This doesn't support the `aliases` attribute of modules. It requires
-    fully-qualified module paths. What *should* happen is that we accept the
-    `library` key in the scenario file, preload a bunch of modules and their
-    aliases, and check if a module that can't be found using a fully-qualified name
-    exists in the preloaded modules.
+    Aliases are resolved through `cache`, which should be built ahead of time
+    from the scenario's declared libraries using `build_module_cache()`. Any
+    paths not found in the cache must be fully-qualified.
+
+    Only the modules that weren't already in `cache` are returned; if every
+    module was found in the cache, this returns an empty dictionary.
     """
     # If a cache exists, check if a module is already in the cache. If it is,
     # exclude it from the explicit import process.
     if cache is None:
         cache = {}
 
-    needs_import = set(module_paths) - set(cache.keys())
+    needs_import = {path for path in module_paths if path not in cache}
 
     if needs_import:
         logger.info(
             f"The following modules were not found in the cache: {needs_import}"
         )
 
-        result = get_objects_by_name(needs_import)
+        # Sorted, so that modules are always imported in the same order
+        result = get_objects_by_name(sorted(needs_import))
 
         for obj in result.values():
             if not issubclass(obj, AKFModule):
@@ -146,21 +229,71 @@ def get_akf_modules(
         return result
 
     logger.info("All declared modules were found in the cache")
-    return cache
+    return {}
+
+
+# The `TypeAdapter` built for each model. See `get_type_adapter()`.
+_type_adapters: dict[type, TypeAdapter[Any]] = {}
+
+
+def get_type_adapter(model: Type[Any]) -> TypeAdapter[Any]:
+    """
+    Get a `TypeAdapter` for a module's argument or configuration model.
+
+    This works for both Pydantic models and `TypedDict` classes; the latter
+    validate to plain dictionaries, skipping model instance construction.
+
+    Building a `TypeAdapter` is comparatively expensive, so a single adapter is
+    built for each model and reused by every action that uses the model.
+    """
+    if (adapter := _type_adapters.get(model)) is None:
+        adapter = _type_adapters[model] = TypeAdapter(model)
+    return adapter
+
+
+# Both null models are empty and immutable, so every action that uses them can
+# share a single instance instead of validating a new one
+_NULL_ARGS = NullArgs()
+_NULL_CONFIG = NullConfig()
+
+
+def validate_model(model: Type[Any], data: Any) -> Any:
+    """
+    Validate a module's arguments or configuration against its model.
+
+    `NullArgs` and `NullConfig` are special-cased, since there is nothing to
+    validate. Note that `NullArgs` still forbids extra arguments, so non-empty
+    arguments are passed through to Pydantic to raise the usual error.
+
+    :param model: The module's argument or configuration model.
+    :param data: The data to validate, or an already-validated instance.
+    :return: The validated data.
+    """
+    if model is NullConfig:
+        return _NULL_CONFIG
+
+    if model is NullArgs and not data:
+        return _NULL_ARGS
+
+    return get_type_adapter(model).validate_python(data)
 
 
 def execute_module(
     module: Type[AKFModule[Any, Any]],
-    args: dict[str, Any],
-    config: dict[str, Any],
-    state: dict[str, Any],
+    args: Mapping[str, Any],
+    config: Any,
+    state: AKFState,
 ) -> None:
     """
     Execute a module with the given arguments and configuration.
+
+    `config` may either be a mapping, or an instance of the module's
+    configuration model that has already been validated (see `get_action_config`),
+    in which case it is used as-is.
     """
     # Build the module's arguments and configuration
-    args_model = module.arg_model.model_validate(args)
-    config_model = module.config_model.model_validate(config)
+    args_model = validate_model(module.arg_model, args)
+    config_model = validate_model(module.config_model, config)
 
     # Execute the module
     module.execute(args_model, config_model, state)
@@ -168,19 +301,104 @@ def execute_module(
 
 def generate_code_from_module(
     module: Type[AKFModule[Any, Any]],
-    args: dict[str, Any],
-    config: dict[str, Any],
-    state: dict[str, Any],
+    args: Mapping[str, Any],
+    config: Any,
+    state: AKFState,
+    action_name: str | None = None,
 ) -> str:
     """
     Generate code for a module with the given arguments and configuration.
+
+    `config` may either be a mapping, or an instance of the module's
+    configuration model that has already been validated (see `get_action_config`),
+    in which case it is used as-is.
+
+    If `action_name` is set, the generated code is assembled into a complete
+    action block: a comment and log statement with the action's name, followed
+    by the module's code and a trailing newline.
     """
     # Build the module's arguments and configuration
-    args_model = module.arg_model.model_validate(args)
-    config_model = module.config_model.model_validate(config)
+    args_model = validate_model(module.arg_model, args)
+    config_model = validate_model(module.config_model, config)
 
     # Generate code
-    return module.generate_code(args_model, config_model, state)
+    code = module.generate_code(args_model, config_model, state)
+    if action_name is None:
+        return code
+
+    # One full newline between each action, at minimum
+    return (
+        f"# {action_name}\n"
+        f'logger.info("Executing action: %s", {action_name!r})\n'
+        f"{code}\n"
+    )
+
+
+def get_action_config(
+    module: Type[AKFModule[Any, Any]],
+    scenario: AKFScenario,
+    action: AKFAction,
+    cache: dict[Type[Any], Any],
+) -> Any:
+    """
+    Get the validated configuration for an action, with the action's configuration
+    keys overriding those set at the scenario level.
+
+    Most actions don't set any configuration of their own, in which case they
+    all share the scenario's configuration. That configuration is only validated
+    once for each immutable (frozen) configuration model, and the result is
+    stored in `cache`. Mutable results, such as the plain dictionaries returned
+    for `TypedDict` models, are validated again for each action, so that a
+    module modifying its configuration doesn't affect later actions.
+
+    :param module: The module the action uses.
+    :param scenario: The scenario the action belongs to.
+    :param action: The action to get the configuration for.
+    :param cache: A dictionary of configuration models to validated scenario-level
+        configurations, shared between all actions of a scenario.
+    :return: An instance of the module's configuration model.
+    """
+    # The action's keys override the scenario's. This is merged into a plain
+    # dictionary, since strict models reject any other mapping type.
+    if action.config:
+        return validate_model(module.config_model, {**scenario.config, **action.config})
+
+    if module.config_model in cache:
+        return cache[module.config_model]
+
+    config = validate_model(module.config_model, scenario.config)
+    if isinstance(config, BaseModel) and config.model_config.get("frozen"):
+        cache[module.config_model] = config
+
+    return config
+
+
+def resolve_actions(
+    scenario: AKFScenario, modules: dict[str, Type[AKFModule[Any, Any]]]
+) -> list[tuple[AKFAction, Type[AKFModule[Any, Any]]]]:
+    """
+    Pair each action in a scenario with the module it uses.
+
+    This is done for every action up front, so that an unknown module is
+    reported before any action is executed or translated.
+
+    The type adapters for each module's argument and configuration models are
+    also built here, so that their schemas are compiled once before the first
+    action runs (and an invalid model is likewise reported up front).
+    """
+    resolved = []
+    for action in scenario.actions:
+        if (module := modules.get(action.module)) is None:
+            raise RuntimeError(
+                f'Module "{action.module}" for action "{action.name}" could not be found.'
+            )
+        resolved.append((action, module))
+
+    for module in {module for _, module in resolved}:
+        get_type_adapter(module.arg_model)
+        get_type_adapter(module.config_model)
+
+    return resolved
 
 
 def execution_entrypoint(
@@ -190,73 +408,75 @@ def execution_entrypoint(
     Entrypoint for the declarative translator.
     """
     # Global state variables
-    state: dict[str, Any] = {}
+    state = AKFState()
 
     # Set global random seed
     random.seed(scenario.seed)
 
+    # Validated scenario-level configurations, see `get_action_config()`
+    config_cache: dict[Type[Any], Any] = {}
+
+    resolved_actions = resolve_actions(scenario, modules)
+
     # Execute each action in sequence
-    for action in scenario.actions:
-        module = modules[action.module]
-        logger.info(f"Executing action: {action.name}")
-        execute_module(module, action.args, scenario.config | action.config, state)
+    for action, module in resolved_actions:
+        logger.info("Executing action: %s", action.name)
+        config = get_action_config(module, scenario, action, config_cache)
+        execute_module(module, action.args, config, state)
 
 
 def translation_entrypoint(
-    scenario: AKFScenario, modules: dict[str, Type[AKFModule[Any, Any]]]
-) -> str:
+    scenario: AKFScenario,
+    modules: dict[str, Type[AKFModule[Any, Any]]],
+    out: IO[str],
+) -> None:
+    """
+    Translate a scenario to Python code.
+
+    The generated code is written to `out` as it's generated, rather than
+    being built up into a single string first.
+
+    :param scenario: The scenario to translate.
+    :param modules: A dictionary of module names to their `AKFModule` classes.
+    :param out: A writable text stream, such as an open file or `sys.stdout`.
+    """
     # State variables
-    state = {"indentation_level": 0}
-
-    # fmt: off
-    result = align_text('''
-        """
-        This file was automatically generated by akf-translate.
-        
-        Verify that the generated code is correct before running it.
-        """
-    ''') + "\n\n"
-    # fmt: on
+    state = AKFState()
+
+    # Every action is resolved before anything is written, so that a missing
+    # module is reported before any code is generated
+    resolved_actions = resolve_actions(scenario, modules)
+
+    out.write(_TRANSLATION_HEADER)
 
     # Generate the import statements by collecting the dependencies declared
     # by each resolved module.
     #
     # `logging` and `sys` are always required to set up the log handler.
-    dependencies = {"logging", "random", "sys"}
-    for action in scenario.actions:
-        module = modules[action.module]
-        dependencies.update(module.dependencies)
-
-    result += generate_import_statements(dependencies) + "\n\n"
-
-    # fmt: off
-    result += align_text('''
-        # Set up logging
-        logging.basicConfig(
-            handlers=[logging.StreamHandler(sys.stdout)],
-            level=logging.INFO,
-            format="%(filename)s:%(lineno)d | %(asctime)s | [%(levelname)s] - %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S",
-        )
-        logger = logging.getLogger()
-    ''') + "\n\n"
-    # fmt: on
+    dependencies = frozenset({"logging", "random", "sys"}).union(
+        *(module.dependencies for _, module in resolved_actions)
+    )
+
+    out.write(generate_import_statements(dependencies) + "\n\n")
+
+    out.write(_LOGGING_SETUP)
 
     # Set raandom seed
-    result += f"random.seed({scenario.seed})\n\n"
+    out.write(f"random.seed({scenario.seed})\n\n")
+
+    # Validated scenario-level configurations, see `get_action_config()`
+    config_cache: dict[Type[Any], Any] = {}
 
     # Generate the code for each action
-    for action in scenario.actions:
-        module = modules[action.module]
-        result += f"# {action.name}\n"
-        result += f"logger.info(r'Executing action: {action.name}')\n"
-        result += generate_code_from_module(
-            module, action.args, scenario.config | action.config, state
+    for action, module in resolved_actions:
+        config = get_action_config(module, scenario, action, config_cache)
+        out.write(
+            generate_code_from_module(
+                module, action.args, config, state, action_name=action.name
+            )
         )
 
-        # One full newline between each action, at minimum
-        result += "\n"
-    return result + "\n"
+    out.write("\n")
 
 
 @click.command(help="Translate or execute declarative AKF scenario files.")
@@ -300,18 +520,19 @@ def main(
     if not (translate ^ execute):
         raise RuntimeError("Exactly one of --translate or --execute must be set.")
 
-    # Load sample.yaml
+    # Load the scenario
     try:
-        scenario = parse_yaml_file_as(AKFScenario, input_file)
+        scenario = load_scenario(input_file)
     except ValidationError as e:
         raise RuntimeError("Invalid AKF scenario file!") from e
 
     logger.info("Collecting modules from declared libraries")
     cache = build_module_cache(scenario.libraries)
 
-    logger.debug("Preloaded modules:")
-    for key, value in cache.items():
-        logger.debug(f"  {key}: {value}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Preloaded modules:")
+        for key, value in cache.items():
+            logger.debug("  %s: %s", key, value)
 
     # Collect a list of all individual actions declared, check if we
     # can import them and build a lookup list
@@ -319,12 +540,13 @@ def main(
     module_paths = {action.module for action in scenario.actions}
     explicit_modules = get_akf_modules(module_paths, cache)
 
-    logger.debug("Newly imported modules:")
-    for key, value in explicit_modules.items():
-        logger.debug(f"  {key}: {value}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Newly imported modules:")
+        for key, value in explicit_modules.items():
+            logger.debug("  %s: %s", key, value)
 
     # Combine the cache and the explicitly imported modules
-    modules = cache | explicit_modules
+    modules = cache | explicit_modules if explicit_modules else cache
 
     if execute:
         execution_entrypoint(scenario, modules)
@@ -334,12 +556,23 @@ def main(
         else:
             logger.info(f"Translating scenario to {output_file=}")
 
-        result = translation_entrypoint(scenario, modules)
-
         # If no output file specified, write to stdout
         if output_file is not None:
-            Path(output_file).write_text(result)
+            # The script is written to a temporary file next to the output file,
+            # which only replaces the output file once the whole scenario has
+            # been translated. Otherwise, an action that fails validation (or
+            # code generation) would leave a partially written script behind.
+            output_path = Path(output_file)
+            temp_path = output_path.with_name(f".{output_path.name}.tmp")
+            try:
+                with open(temp_path, "w") as f:
+                    translation_entrypoint(scenario, modules, f)
+                os.replace(temp_path, output_path)
+            finally:
+                temp_path.unlink(missing_ok=True)
         else:
-            print("\n" + result)
+            sys.stdout.write("\n")
+            translation_entrypoint(scenario, modules, sys.stdout)
+            sys.stdout.write("\n")
     else:
         raise AssertionError
@@ -1,11 +1,10 @@
+import functools
 import importlib
-import inspect
 import logging
-import pkgutil
-from textwrap import dedent
+from textwrap import dedent, indent
 from typing import Any, List, Type
 
-from akflib.declarative.core import AKFModule
+from akflib.declarative.core import AKFModule, AKFState
 
 logger = logging.getLogger(__name__)
 
@@ -14,11 +13,17 @@ def get_subclasses_recursive(type: Type[Any]) -> list[Type[Any]]:
     """
     Get all visible subclasses of `type`, recursive.
 
-    From https://stackoverflow.com/questions/3862310
+    Adapted from https://stackoverflow.com/questions/3862310; this walks the
+    class hierarchy with an explicit stack instead of recursing, so that
+    `__subclasses__()` is only called once per class.
     """
-    subclasses = set(type.__subclasses__()).union(
-        [s for c in type.__subclasses__() for s in get_subclasses_recursive(c)]
-    )
+    subclasses: set[Type[Any]] = set()
+    stack = [type]
+    while stack:
+        for subclass in stack.pop().__subclasses__():
+            if subclass not in subclasses:
+                subclasses.add(subclass)
+                stack.append(subclass)
 
     return list(subclasses)
 
@@ -32,9 +37,13 @@ def get_full_qualname(type: Type[Any]) -> str:
     return ".".join([type.__module__, type.__name__])
 
 
+@functools.lru_cache(maxsize=256)
 def align_text(text: str) -> str:
     """
     Dedent and strip the provided text.
+
+    Most of the text passed here is a template that only differs by a few
+    values (if at all), so results are cached.
     """
     return dedent(text).strip()
 
@@ -47,31 +56,66 @@ def indent_text(text: str, indentation: int, spaces: int = 4) -> str:
     :param indentation: The number of times to indent the text.
     :param spaces: The number of spaces to use for each indentation level.
     """
-    return "\n".join(
-        [f"{' ' * (spaces * indentation)}{line}" for line in text.split("\n")]
-    )
+    # Blank lines are indented too, which `textwrap.indent` skips by default
+    return indent(text, " " * (spaces * indentation), lambda _: True)
 
 
-def auto_format(text: str, state: dict[str, Any]) -> str:
+def auto_format(text: str, state: AKFState) -> str:
     """
     Automatically format the provided text based on the global state machine.
 
-    The `indentation` key is used to determine where to indent the text.
+    The `indentation_level` attribute is used to determine where to indent the text.
+    """
+    return _auto_format(text, state.indentation_level)
+
+
+@functools.lru_cache(maxsize=4096)
+def _auto_format(text: str, indentation_level: int) -> str:
     """
-    return indent_text(align_text(text), state.get("indentation_level", 0)) + "\n"
+    Implementation of `auto_format()`, cached by text and indentation level.
+
+    Only the indentation level of the state affects the result, so the same
+    snippet at the same level is only formatted once.
+    """
+    aligned = align_text(text)
+
+    # Most generated code isn't nested, so there's usually nothing to indent
+    if indentation_level == 0:
+        return aligned + "\n"
+
+    return indent_text(aligned, indentation_level) + "\n"
 
 
 def import_all_modules(base_package: str) -> List[Type[AKFModule[Any, Any]]]:
     """
     Recursively import all subclasses of AKFModule under a specified package path.
 
+    Each package is only walked once per process; later calls return the
+    classes found by the first call. Modules that are defined after a package
+    has been walked (i.e. not at import time) won't be picked up.
+
     Args:
         base_package: The base package path (e.g., 'akflib.modules')
 
     Returns:
         A list of all AKFModule subclasses found in the package and its subpackages
     """
+    # The cached result is a tuple, so callers are free to modify their copy
+    return list(_import_all_modules(base_package))
+
+
+@functools.lru_cache(maxsize=None)
+def _import_all_modules(base_package: str) -> tuple[Type[AKFModule[Any, Any]], ...]:
+    """
+    Implementation of `import_all_modules()`, cached by package path.
+    """
+    # This is only needed to walk packages, which most importers of this
+    # module (i.e. modules that just use `auto_format()`) never do
+    import pkgutil
+
     modules = []
+    # Mirrors `modules`, for fast membership checks
+    seen: set[Type[AKFModule[Any, Any]]] = set()
 
     def _import_recursive(package_name: str) -> None:
         """Recursively import all submodules of a package."""
@@ -93,17 +137,21 @@ def import_all_modules(base_package: str) -> List[Type[AKFModule[Any, Any]]]:
                         if is_pkg:
                             _import_recursive(name)
 
-                        # Find all AKFModule subclasses in this module
-                        for _, obj in inspect.getmembers(submodule, inspect.isclass):
+                        # Find all AKFModule subclasses in this module. The module's
+                        # namespace is scanned directly, rather than through
+                        # `inspect.getmembers()`, which also sorts the members
+                        for obj in vars(submodule).values():
                             if (
-                                issubclass(obj, AKFModule)
+                                isinstance(obj, type)
+                                and issubclass(obj, AKFModule)
                                 and obj.__module__ == name
                                 and obj is not AKFModule
                             ):
 
                                 # Check if the class is already in the list to avoid duplicates
-                                if obj not in modules:
+                                if obj not in seen:
                                     # logger.debug(f"Found AKFModule subclass: {obj.__module__}.{obj.__name__}")
+                                    seen.add(obj)
                                     modules.append(obj)
 
                     except (ImportError, AttributeError) as e:
@@ -117,7 +165,7 @@ def import_all_modules(base_package: str) -> List[Type[AKFModule[Any, Any]]]:
     # Start the recursive import
     _import_recursive(base_package)
 
-    return modules
+    return tuple(modules)
 
 
 def get_all_module_classes(
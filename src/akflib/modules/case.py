@@ -8,10 +8,16 @@ This covers the following functionality:
 
 import logging
 from pathlib import Path
-from typing import Any, ClassVar
-
-from akflib.declarative.core import AKFModule, AKFModuleArgs, NullArgs, NullConfig
-from akflib.declarative.util import auto_format
+from typing import ClassVar
+
+from akflib.declarative.core import (
+    AKFModule,
+    AKFModuleArgs,
+    AKFState,
+    NullArgs,
+    NullConfig,
+)
+from akflib.declarative.util import align_text, auto_format
 from akflib.rendering.core import bundle_to_pdf, get_pandoc_path, get_renderer_classes
 from akflib.rendering.objs import AKFBundle
 
@@ -19,31 +25,64 @@ from akflib.rendering.objs import AKFBundle
 
 logger = logging.getLogger(__name__)
 
+# The code generated by `RenderAKFBundleModule`, filled in with `str.format()`
+# fmt: off
+_RENDER_TEMPLATE = align_text("""
+    renderer_classes = get_renderer_classes([
+    {renderers}
+    ])
+
+    {pandoc_block}
+
+    pandoc_output_folder = Path({output_folder!r})
+    pandoc_output_folder.mkdir(parents=True, exist_ok=True)
+
+    bundle_to_pdf(
+        {akf_bundle_var},
+        renderer_classes,
+        pandoc_output_folder,
+        pandoc_path,
+        group_renderers={group_renderers},
+    )
+    """)
+# fmt: on
+
+# Used in place of an explicit Pandoc path in `_RENDER_TEMPLATE`
+# fmt: off
+_FIND_PANDOC_CODE = align_text("""
+    pandoc_path = get_pandoc_path()
+    if pandoc_path is None:
+        raise RuntimeError("Unable to find path to Pandoc executable (make sure it is on PATH)")
+    """)
+# fmt: on
+
 
 class AKFBundleModule(AKFModule[NullArgs, NullConfig]):
     """
-    Create a new AKFBundle object and add it to the state dictionary.
+    Create a new AKFBundle object and add it to the state.
     """
 
     aliases = ["akf_bundle", "create_akf_bundle"]
     arg_model = NullArgs
     config_model = NullConfig
 
-    dependencies: ClassVar[set[str]] = {"akflib.rendering.objs.AKFBundle"}
+    dependencies: ClassVar[frozenset[str]] = frozenset(
+        {"akflib.rendering.objs.AKFBundle"}
+    )
 
     @classmethod
     def generate_code(
         cls,
         args: NullArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> str:
-        if "akflib.akf_bundle_var" in state:
+        if state.akf_bundle_var is not None:
             logger.warning(
                 "A previous AKFBundle has already been instantiated, it will be lost from state!"
             )
 
-        state["akflib.akf_bundle_var"] = "akf_bundle"
+        state.akf_bundle_var = "akf_bundle"
 
         return auto_format(
             "akf_bundle = AKFBundle()",
@@ -55,18 +94,20 @@ class AKFBundleModule(AKFModule[NullArgs, NullConfig]):
         cls,
         args: NullArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> None:
-        if "akflib.akf_bundle" in state:
+        if state.akf_bundle is not None:
             logger.warning(
                 "A previous AKFBundle has already been instantiated, it will be lost from state!"
             )
 
-        state["akflib.akf_bundle"] = AKFBundle()
+        state.akf_bundle = AKFBundle()
 
 
 class WriteAKFBundleModuleArgs(AKFModuleArgs):
-    output_path: Path = Path("bundle.jsonld")
+    # Paths are kept as strings, since they're only embedded into generated
+    # code during translation; they're converted to `Path` objects on execution
+    output_path: str = "bundle.jsonld"
     indent: int = 2
 
 
@@ -79,14 +120,22 @@ class WriteAKFBundleModule(AKFModule[WriteAKFBundleModuleArgs, NullConfig]):
     arg_model = WriteAKFBundleModuleArgs
     config_model = NullConfig
 
-    dependencies: ClassVar[set[str]] = {"pathlib.Path"}
+    dependencies: ClassVar[frozenset[str]] = frozenset({"pathlib.Path"})
+
+    # The code generated by this module, filled in with `str.format()`
+    _code_template: ClassVar[str] = (
+        "{akf_bundle_var}.write_to_jsonld(\n"
+        "    Path({output_path!r}),\n"
+        "    indent={indent}\n"
+        ")"
+    )
 
     @classmethod
     def generate_code(
         cls,
         args: WriteAKFBundleModuleArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> str:
         akf_bundle_var = cls.get_akf_bundle_var(state)
         if akf_bundle_var is None:
@@ -94,10 +143,11 @@ class WriteAKFBundleModule(AKFModule[WriteAKFBundleModuleArgs, NullConfig]):
             return ""
 
         return auto_format(
-            f"{akf_bundle_var}.write_to_jsonld(\n"
-            f'    Path("{args.output_path.as_posix()}"),\n'
-            f"    indent={args.indent}\n"
-            ")",
+            cls._code_template.format(
+                akf_bundle_var=akf_bundle_var,
+                output_path=args.output_path,
+                indent=args.indent,
+            ),
             state,
         )
 
@@ -106,7 +156,7 @@ class WriteAKFBundleModule(AKFModule[WriteAKFBundleModuleArgs, NullConfig]):
         cls,
         args: WriteAKFBundleModuleArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> None:
         akf_bundle = cls.get_akf_bundle(state)
         if akf_bundle is None:
@@ -114,7 +164,7 @@ class WriteAKFBundleModule(AKFModule[WriteAKFBundleModuleArgs, NullConfig]):
             return
 
         logger.info(f"Writing AKFBundle to {args.output_path}")
-        akf_bundle.write_to_jsonld(args.output_path, indent=args.indent)
+        akf_bundle.write_to_jsonld(Path(args.output_path), indent=args.indent)
 
 
 class RenderAKFBundleModuleArgs(AKFModuleArgs):
@@ -124,9 +174,11 @@ class RenderAKFBundleModuleArgs(AKFModuleArgs):
 
     renderers: list[str]
 
-    output_folder: Path = Path("output")
+    # As with `WriteAKFBundleModuleArgs`, these are converted to `Path` objects
+    # on execution
+    output_folder: str = "output"
 
-    pandoc_path: Path | None = None
+    pandoc_path: str | None = None
 
     group_renderers: bool = False
 
@@ -140,19 +192,21 @@ class RenderAKFBundleModule(AKFModule[RenderAKFBundleModuleArgs, NullConfig]):
     arg_model = RenderAKFBundleModuleArgs
     config_model = NullConfig
 
-    dependencies: ClassVar[set[str]] = {
-        "akflib.rendering.core.bundle_to_pdf",
-        "akflib.rendering.core.get_pandoc_path",
-        "akflib.rendering.core.get_renderer_classes",
-        "pathlib.Path",
-    }
+    dependencies: ClassVar[frozenset[str]] = frozenset(
+        {
+            "akflib.rendering.core.bundle_to_pdf",
+            "akflib.rendering.core.get_pandoc_path",
+            "akflib.rendering.core.get_renderer_classes",
+            "pathlib.Path",
+        }
+    )
 
     @classmethod
     def generate_code(
         cls,
         args: RenderAKFBundleModuleArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> str:
         akf_bundle_var = cls.get_akf_bundle_var(state)
         if akf_bundle_var is None:
@@ -163,8 +217,6 @@ class RenderAKFBundleModule(AKFModule[RenderAKFBundleModuleArgs, NullConfig]):
             logger.warning("No renderers specified, skipping")
             return ""
 
-        result = ""
-
         # Use get_renderer_classes to get the renderer classes from the provided
         # renderer paths. We *could* generate actual import statements, but this
         # is better from both a readability and runtime correctness perspective.
@@ -172,33 +224,21 @@ class RenderAKFBundleModule(AKFModule[RenderAKFBundleModuleArgs, NullConfig]):
         # The actual renderer classes are not validated here, which allows a
         # declarative script to be translated even if the renderer classes are not
         # available in the current environment.
-        result += "renderer_classes = get_renderer_classes([\n"
-        result += ",\n".join([f'    "{renderer}"' for renderer in args.renderers])
-        result += "\n])\n"
-        result += "\n"
+        renderers = ",\n".join([f'    "{renderer}"' for renderer in args.renderers])
 
         if args.pandoc_path:
-            result += f"pandoc_path = Path({args.pandoc_path.as_posix()})\n"
+            pandoc_block = f"pandoc_path = Path({args.pandoc_path!r})"
         else:
-            result += "pandoc_path = get_pandoc_path()\n"
-            result += "if pandoc_path is None:\n"
-            result += '    raise RuntimeError("Unable to find path to Pandoc executable (make sure it is on PATH)")\n'
-        result += "\n"
-
-        result += f'pandoc_output_folder = Path("{args.output_folder.as_posix()}")\n'
-        result += "pandoc_output_folder.mkdir(parents=True, exist_ok=True)\n"
-        result += "\n"
-
-        result += "bundle_to_pdf(\n"
-        result += f"    {akf_bundle_var},\n"
-        result += "    renderer_classes,\n"
-        result += "    pandoc_output_folder,\n"
-        result += "    pandoc_path,\n"
-        result += f"    group_renderers={args.group_renderers},\n"
-        result += ")"
+            pandoc_block = _FIND_PANDOC_CODE
 
         return auto_format(
-            result,
+            _RENDER_TEMPLATE.format(
+                renderers=renderers,
+                pandoc_block=pandoc_block,
+                output_folder=args.output_folder,
+                akf_bundle_var=akf_bundle_var,
+                group_renderers=args.group_renderers,
+            ),
             state,
         )
 
@@ -207,7 +247,7 @@ class RenderAKFBundleModule(AKFModule[RenderAKFBundleModuleArgs, NullConfig]):
         cls,
         args: RenderAKFBundleModuleArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> None:
         akf_bundle = cls.get_akf_bundle(state)
         if akf_bundle is None:
@@ -225,25 +265,25 @@ class RenderAKFBundleModule(AKFModule[RenderAKFBundleModuleArgs, NullConfig]):
         logger.info(f"Renderer classes: {renderer_classes}")
 
         # Get pandoc path
-        if not args.pandoc_path:
-            args.pandoc_path = get_pandoc_path()
+        pandoc_path = Path(args.pandoc_path) if args.pandoc_path else get_pandoc_path()
 
-        if not args.pandoc_path:
+        if not pandoc_path:
             logger.warning(
                 "Unable to find path to Pandoc executable (make sure it is on PATH) - skipping"
             )
             return
 
-        args.pandoc_path = args.pandoc_path.resolve()
-        logger.info(f"Pandoc path: {args.pandoc_path}")
+        pandoc_path = pandoc_path.resolve()
+        logger.info(f"Pandoc path: {pandoc_path}")
 
-        args.output_folder.mkdir(parents=True, exist_ok=True)
+        output_folder = Path(args.output_folder)
+        output_folder.mkdir(parents=True, exist_ok=True)
 
         # Perform the actual rendering
         bundle_to_pdf(
             akf_bundle,
             renderer_classes,
-            args.output_folder,
-            args.pandoc_path,
+            output_folder,
+            pandoc_path,
             group_renderers=args.group_renderers,
         )
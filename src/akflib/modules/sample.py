@@ -3,9 +3,9 @@ The simplest declarative module example.
 """
 
 import random
-from typing import Any, ClassVar
+from typing import ClassVar
 
-from akflib.declarative.core import AKFModule, AKFModuleArgs, AKFModuleConfig
+from akflib.declarative.core import AKFModule, AKFModuleArgs, AKFModuleConfig, AKFState
 from akflib.declarative.util import auto_format
 
 
@@ -23,14 +23,19 @@ class SampleModule(AKFModule[SampleModuleArgs, SampleModuleConfig]):
     arg_model = SampleModuleArgs
     config_model = SampleModuleConfig
 
-    dependencies: ClassVar[set[str]] = {"random"}
+    dependencies: ClassVar[frozenset[str]] = frozenset({"random"})
+
+    # The code generated by this module, filled in with `str.format()`
+    _code_template: ClassVar[str] = (
+        'print(f\'I choose {{random.choice(("{arg1}", "{arg2}"))}}\')'
+    )
 
     @classmethod
     def generate_code(
-        cls, args: SampleModuleArgs, config: SampleModuleConfig, state: dict[str, Any]
+        cls, args: SampleModuleArgs, config: SampleModuleConfig, state: AKFState
     ) -> str:
         return auto_format(
-            f'print(f\'I choose {{random.choice(("{args.arg1}", "{args.arg2}"))}}\')',
+            cls._code_template.format(arg1=args.arg1, arg2=args.arg2),
             state,
         )
 
@@ -39,6 +44,6 @@ class SampleModule(AKFModule[SampleModuleArgs, SampleModuleConfig]):
         cls,
         args: SampleModuleArgs,
         config: SampleModuleConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> None:
         print(f"I choose {random.choice((args.arg1, args.arg2))}")
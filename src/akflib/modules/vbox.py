@@ -4,10 +4,10 @@ Declarative modules for interacting with VirtualBox and a running VirtualBox VM.
 
 import logging
 from pathlib import Path
-from typing import Any, ClassVar
+from typing import ClassVar
 
 from akflib.core.hypervisor.vbox import VBoxExportFormatEnum, VBoxHypervisor
-from akflib.declarative.core import AKFModule, AKFModuleArgs, NullConfig
+from akflib.declarative.core import AKFModule, AKFModuleArgs, AKFState, NullConfig
 from akflib.declarative.util import auto_format
 
 # from caselib.uco.core import Bundle
@@ -15,44 +15,74 @@ from akflib.declarative.util import auto_format
 logger = logging.getLogger(__name__)
 
 
+def _require_vbox_hypervisor(state: AKFState, action: str) -> VBoxHypervisor:
+    """
+    Get the active hypervisor object from the state, which must be a
+    `VBoxHypervisor`.
+
+    :param state: The current state.
+    :param action: A short description of what the calling module is trying
+        to do, used in the error message (e.g. "start machine").
+    :raises RuntimeError: If no hypervisor object has been instantiated, or if
+        it isn't a `VBoxHypervisor`.
+    :return: The active `VBoxHypervisor` object.
+    """
+    hypervisor = state.hypervisor
+    if isinstance(hypervisor, VBoxHypervisor):
+        return hypervisor
+
+    if not hypervisor:
+        raise RuntimeError(
+            f"Hypervisor object not previously instantiated, can't {action}"
+        )
+
+    raise RuntimeError("Hypervisor object is not a VBoxHypervisor object")
+
+
 class VBoxCreateModuleArgs(AKFModuleArgs):
     machine_name: str
 
 
 class VBoxCreateModule(AKFModule[VBoxCreateModuleArgs, NullConfig]):
     """
-    Instantiate a new VBoxHypervisor object and add it to the state dictionary.
+    Instantiate a new VBoxHypervisor object and add it to the state.
     """
 
     aliases = ["vbox_start"]
     arg_model = VBoxCreateModuleArgs
     config_model = NullConfig
 
-    dependencies: ClassVar[set[str]] = {"akflib.core.hypervisor.vbox.VBoxHypervisor"}
+    dependencies: ClassVar[frozenset[str]] = frozenset(
+        {"akflib.core.hypervisor.vbox.VBoxHypervisor"}
+    )
+
+    # The code generated by this module, filled in with `str.format()`
+    _code_template: ClassVar[str] = (
+        "vbox_obj = VBoxHypervisor({machine_name!r}{bundle})"
+    )
 
     @classmethod
     def generate_code(
         cls,
         args: VBoxCreateModuleArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> str:
         if cls.get_hypervisor_var(state):
             logger.warning(
                 "A previous hypervisor has already been instantiated, it will be lost from state!"
             )
 
-        state["akflib.hypervisor_var"] = "vbox_obj"
+        state.hypervisor_var = "vbox_obj"
 
         # Check if an AKFBundle is available
-        if akf_bundle_var := cls.get_akf_bundle_var(state):
-            return auto_format(
-                f'vbox_obj = VBoxHypervisor("{args.machine_name}", {akf_bundle_var})',
-                state,
-            )
+        akf_bundle_var = cls.get_akf_bundle_var(state)
 
         return auto_format(
-            f'vbox_obj = VBoxHypervisor("{args.machine_name}")',
+            cls._code_template.format(
+                machine_name=args.machine_name,
+                bundle=f", {akf_bundle_var}" if akf_bundle_var else "",
+            ),
             state,
         )
 
@@ -61,7 +91,7 @@ class VBoxCreateModule(AKFModule[VBoxCreateModuleArgs, NullConfig]):
         cls,
         args: VBoxCreateModuleArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> None:
         if cls.get_hypervisor(state):
             logger.warning(
@@ -73,7 +103,7 @@ class VBoxCreateModule(AKFModule[VBoxCreateModuleArgs, NullConfig]):
         else:
             vbox_obj = VBoxHypervisor(args.machine_name)
 
-        state["akflib.hypervisor"] = vbox_obj
+        state.hypervisor = vbox_obj
 
 
 class VBoxStartMachineModuleArgs(AKFModuleArgs):
@@ -89,14 +119,21 @@ class VBoxStartMachineModule(AKFModule[VBoxStartMachineModuleArgs, NullConfig]):
     arg_model = VBoxStartMachineModuleArgs
     config_model = NullConfig
 
-    dependencies: ClassVar[set[str]] = {"akflib.core.hypervisor.vbox.VBoxHypervisor"}
+    dependencies: ClassVar[frozenset[str]] = frozenset(
+        {"akflib.core.hypervisor.vbox.VBoxHypervisor"}
+    )
+
+    # The code generated by this module, filled in with `str.format()`
+    _code_template: ClassVar[str] = (
+        "{hypervisor_var}.start_vm(wait_for_guest_additions={wait_for_guest_additions})"
+    )
 
     @classmethod
     def generate_code(
         cls,
         args: VBoxStartMachineModuleArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> str:
         hypervisor_var = cls.get_hypervisor_var(state)
         if not hypervisor_var:
@@ -105,7 +142,10 @@ class VBoxStartMachineModule(AKFModule[VBoxStartMachineModuleArgs, NullConfig]):
             )
 
         return auto_format(
-            f"{hypervisor_var}.start_vm(wait_for_guest_additions={args.wait_for_guest_additions})",
+            cls._code_template.format(
+                hypervisor_var=hypervisor_var,
+                wait_for_guest_additions=args.wait_for_guest_additions,
+            ),
             state,
         )
 
@@ -114,17 +154,9 @@ class VBoxStartMachineModule(AKFModule[VBoxStartMachineModuleArgs, NullConfig]):
         cls,
         args: VBoxStartMachineModuleArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> None:
-        hypervisor = cls.get_hypervisor(state)
-        if not hypervisor:
-            raise RuntimeError(
-                "Hypervisor object not previously instantiated, can't start machine"
-            )
-
-        if not isinstance(hypervisor, VBoxHypervisor):
-            raise RuntimeError("Hypervisor object is not a VBoxHypervisor object")
-
+        hypervisor = _require_vbox_hypervisor(state, "start machine")
         hypervisor.start_vm(wait_for_guest_additions=args.wait_for_guest_additions)
 
 
@@ -141,14 +173,19 @@ class VBoxStopMachineModule(AKFModule[VBoxStopMachineModuleArgs, NullConfig]):
     arg_model = VBoxStopMachineModuleArgs
     config_model = NullConfig
 
-    dependencies: ClassVar[set[str]] = {"akflib.core.hypervisor.vbox.VBoxHypervisor"}
+    dependencies: ClassVar[frozenset[str]] = frozenset(
+        {"akflib.core.hypervisor.vbox.VBoxHypervisor"}
+    )
+
+    # The code generated by this module, filled in with `str.format()`
+    _code_template: ClassVar[str] = "{hypervisor_var}.stop_vm(force={force})"
 
     @classmethod
     def generate_code(
         cls,
         args: VBoxStopMachineModuleArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> str:
         hypervisor_var = cls.get_hypervisor_var(state)
         if not hypervisor_var:
@@ -157,7 +194,7 @@ class VBoxStopMachineModule(AKFModule[VBoxStopMachineModuleArgs, NullConfig]):
             )
 
         return auto_format(
-            f"{hypervisor_var}.stop_vm(force={args.force})",
+            cls._code_template.format(hypervisor_var=hypervisor_var, force=args.force),
             state,
         )
 
@@ -166,17 +203,9 @@ class VBoxStopMachineModule(AKFModule[VBoxStopMachineModuleArgs, NullConfig]):
         cls,
         args: VBoxStopMachineModuleArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> None:
-        hypervisor = cls.get_hypervisor(state)
-        if not hypervisor:
-            raise RuntimeError(
-                "Hypervisor object not previously instantiated, can't stop machine"
-            )
-
-        if not isinstance(hypervisor, VBoxHypervisor):
-            raise RuntimeError("Hypervisor object is not a VBoxHypervisor object")
-
+        hypervisor = _require_vbox_hypervisor(state, "stop machine")
         hypervisor.stop_vm(force=args.force)
 
 
@@ -196,18 +225,28 @@ class VBoxCreateDiskImageModule(AKFModule[VBoxCreateDiskImageModuleArgs, NullCon
     arg_model = VBoxCreateDiskImageModuleArgs
     config_model = NullConfig
 
-    dependencies: ClassVar[set[str]] = {
-        "akflib.core.hypervisor.vbox.VBoxHypervisor",
-        "akflib.core.hypervisor.vbox.VBoxExportFormatEnum",
-        "pathlib.Path",
-    }
+    dependencies: ClassVar[frozenset[str]] = frozenset(
+        {
+            "akflib.core.hypervisor.vbox.VBoxHypervisor",
+            "akflib.core.hypervisor.vbox.VBoxExportFormatEnum",
+            "pathlib.Path",
+        }
+    )
+
+    # The code generated by this module, filled in with `str.format()`
+    _code_template: ClassVar[str] = (
+        "{hypervisor_var}.create_disk_image(\n"
+        "    Path({output_path!r}),\n"
+        "    VBoxExportFormatEnum.{image_format}\n"
+        ")"
+    )
 
     @classmethod
     def generate_code(
         cls,
         args: VBoxCreateDiskImageModuleArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> str:
         hypervisor_var = cls.get_hypervisor_var(state)
         if not hypervisor_var:
@@ -216,10 +255,11 @@ class VBoxCreateDiskImageModule(AKFModule[VBoxCreateDiskImageModuleArgs, NullCon
             )
 
         return auto_format(
-            f"{hypervisor_var}.create_disk_image(\n"
-            f'    Path("{args.output_path.as_posix()}"),\n'
-            f"    VBoxExportFormatEnum.{args.image_format.name}\n"
-            f")",
+            cls._code_template.format(
+                hypervisor_var=hypervisor_var,
+                output_path=args.output_path.as_posix(),
+                image_format=args.image_format.name,
+            ),
             state,
         )
 
@@ -228,15 +268,7 @@ class VBoxCreateDiskImageModule(AKFModule[VBoxCreateDiskImageModuleArgs, NullCon
         cls,
         args: VBoxCreateDiskImageModuleArgs,
         config: NullConfig,
-        state: dict[str, Any],
+        state: AKFState,
     ) -> None:
-        hypervisor = cls.get_hypervisor(state)
-        if not hypervisor:
-            raise RuntimeError(
-                "Hypervisor object not previously instantiated, can't create disk image"
-            )
-
-        if not isinstance(hypervisor, VBoxHypervisor):
-            raise RuntimeError("Hypervisor object is not a VBoxHypervisor object")
-
+        hypervisor = _require_vbox_hypervisor(state, "create disk image")
         hypervisor.create_disk_image(args.output_path, args.image_format)
@@ -3,17 +3,82 @@ Render information from (a sequence of) WindowsPrefetch objects.
 """
 
 import logging
+from operator import attrgetter
 from pathlib import Path
-from typing import ClassVar, Type
+from typing import Any, ClassVar, Iterable, Iterator, Type
 
 from caselib.uco.core import UcoObject, UcoThing
 from caselib.uco.observable import WindowsPrefetch, WindowsPrefetchFacet
-from tabulate import tabulate
 
-from akflib.rendering.objs import CASERenderer
+from akflib.rendering.objs import CASERenderer, first_item
 
 logger = logging.getLogger(__name__)
 
+# The fields of a WindowsPrefetchFacet shown in the prefetch table
+_FACET_FIELDS = attrgetter("applicationFileName", "timesExecuted", "lastRun")
+
+
+def _render_github_table(headers: list[str], rows: list[list[Any]]) -> str:
+    """
+    Render a GitHub-flavored Markdown table, with every column left-aligned.
+
+    This covers the (small) subset of `tabulate(..., tablefmt="github")` used
+    by this renderer, without the overhead of tabulate's type inference and
+    alignment logic.
+
+    :param headers: The column headers.
+    :param rows: The rows of the table. Each row should have one cell for each
+        header, and cells are converted to strings as-is.
+    :return: The rendered table, without a trailing newline.
+    """
+    cells = [[str(cell) for cell in row] for row in rows]
+    # Each column is as wide as its widest cell, including the header
+    widths = [max(map(len, column)) for column in zip(headers, *cells)]
+
+    def _render_row(row: list[str]) -> str:
+        return "| " + " | ".join(map(str.ljust, row, widths)) + " |"
+
+    lines = [_render_row(headers)]
+    lines.append("|" + "|".join("-" * (width + 2) for width in widths) + "|")
+    lines.extend(_render_row(row) for row in cells)
+
+    return "\n".join(lines)
+
+
+def _iter_prefetch_rows(objects: Iterable[UcoThing]) -> Iterator[list[Any]]:
+    """
+    Yield a table row for each well-formed WindowsPrefetch object.
+
+    Objects that aren't `WindowsPrefetch` objects, or that don't have a
+    `WindowsPrefetchFacet`, are skipped.
+
+    :param objects: The objects passed to `PrefetchRenderer.render_objects()`.
+    """
+    for obj in objects:
+        if not isinstance(obj, WindowsPrefetch):
+            continue
+
+        # Extract facets - we only expect a single facet, so if `hasFacet` is a
+        # list, take the first element
+        facet = first_item(obj.hasFacet)
+
+        if not isinstance(facet, WindowsPrefetchFacet):
+            continue
+
+        application_name, times_executed, last_run = _FACET_FIELDS(facet)
+
+        # The last run time is formatted the same as
+        # `strftime("%Y-%m-%dT%H:%M:%S")`, without the format parsing
+        yield [
+            application_name or "?",
+            times_executed or "?",
+            (
+                last_run.replace(tzinfo=None).isoformat(timespec="seconds")
+                if last_run
+                else "?"
+            ),
+        ]
+
 
 class PrefetchRenderer(CASERenderer):
     """
@@ -34,44 +99,15 @@ class PrefetchRenderer(CASERenderer):
             for PrefetchRenderer.
         :return: A string containing the rendered output.
         """
-        result = ""
-
-        # Header
-        result += "## Windows Prefetch files\n\n"
-
         headers = ["Application", "Times executed", "Last run"]
-        data = []
 
         logger.info(f"Processing {len(objects)} WindowsPrefetch objects")
 
         # Go through each WindowsPrefetch object
-        for obj in objects:
-            if not isinstance(obj, WindowsPrefetch):
-                continue
-
-            # Extract facets - we only expect a single facet
-            facet = obj.hasFacet
-
-            # If `facets` is a list, take the first element
-            if isinstance(facet, list) and len(facet) > 0:
-                facet = facet[0]
-
-            if not isinstance(facet, WindowsPrefetchFacet):
-                continue
-
-            data.append(
-                [
-                    facet.applicationFileName if facet.applicationFileName else "?",
-                    facet.timesExecuted if facet.timesExecuted else "?",
-                    (
-                        facet.lastRun.strftime("%Y-%m-%dT%H:%M:%S")
-                        if facet.lastRun
-                        else "?"
-                    ),
-                ]
-            )
-
-        # Render with tabulate
-        result += tabulate(data, headers=headers, tablefmt="github") + "\n\n"
-
-        return result
+        data = list(_iter_prefetch_rows(objects))
+
+        # Render as a Markdown table, separated from the header (and whatever
+        # follows this section) by a blank line
+        table = _render_github_table(headers, data)
+
+        return "\n\n".join(["## Windows Prefetch files", table, ""])
@@ -3,8 +3,9 @@ Render information from URLHistory objects.
 """
 
 import logging
+from operator import attrgetter
 from pathlib import Path
-from typing import Any, ClassVar, Type
+from typing import Any, ClassVar, Iterator, Type
 
 from caselib.uco.core import UcoObject, UcoThing
 from caselib.uco.observable import (
@@ -16,16 +17,61 @@ from caselib.uco.observable import (
     URLHistoryEntry,
     URLHistoryFacet,
 )
-from tabulate import tabulate
 
-from akflib.rendering.objs import CASERenderer
+from akflib.rendering.objs import CASERenderer, first_item
 
 logger = logging.getLogger(__name__)
 
+# The section rendered for each browser; `body` is either the history table
+# or a note that there are no entries
+_BROWSER_SECTION_TEMPLATE = "### Browser: {browser_name} ({idx})\n\n{body}"
+
+# The fields of a URLHistoryEntry shown in the history table
+_ENTRY_FIELDS = attrgetter("pageTitle", "lastVisit", "visitCount")
+
+
+def _iter_valid_entries(
+    entries: list[Any],
+) -> Iterator[tuple[URLFacet, URLHistoryEntry]]:
+    """
+    Yield each well-formed URL history entry, alongside the facet of its URL.
+
+    Entries that aren't `URLHistoryEntry` objects, or that don't have a URL
+    with a `URLFacet`, are logged and skipped. This keeps all of the type
+    checking out of the loop that actually renders each entry.
+
+    :param entries: The `urlHistoryEntry` list of a `URLHistoryFacet`.
+    """
+    for history_entry in entries:
+        if not isinstance(history_entry, URLHistoryEntry):
+            logger.warning(
+                f"Entry {history_entry} is not a URLHistoryEntry object, skipping"
+            )
+            continue
+
+        # Extract the URL, which must have a URLFacet to get the full URL from
+        url = history_entry.url
+        if not isinstance(url, URL):
+            logger.warning(f"URL {url} is not a URL object, skipping")
+            continue
+
+        if not url.hasFacet:
+            logger.warning(f"URL {url} has no facets, skipping")
+            continue
+
+        # Flatten facet if it's a list, we should only have one URLFacet
+        url_facet = first_item(url.hasFacet)
+
+        if not isinstance(url_facet, URLFacet):
+            logger.warning(f"Facet {url_facet} is not a URLFacet object, skipping")
+            continue
+
+        yield url_facet, history_entry
+
 
 class URLHistoryRenderer(CASERenderer):
     """
-    Render WindowsPrefetch objects.
+    Render URLHistory objects.
     """
 
     name: ClassVar[str] = "urlhistory"
@@ -35,17 +81,19 @@ class URLHistoryRenderer(CASERenderer):
     @classmethod
     def render_objects(cls, objects: list[UcoThing], base_asset_folder: Path) -> str:
         """
-        Render a sequence of WindowsPrefetch objects.
+        Render a sequence of URLHistory objects.
 
-        :param objects: The list of WindowsPrefetch objects to render.
+        :param objects: The list of URLHistory objects to render.
         :param base_asset_folder: The folder to place assets in. This is unused
-            for PrefetchRenderer.
+            for URLHistoryRenderer.
         :return: A string containing the rendered output.
         """
-        result = ""
+        # Only needed once something is actually rendered, rather than whenever
+        # renderers are imported to be looked up by name
+        from tabulate import tabulate
 
-        # Header
-        result += "## Browser histories\n\n"
+        # The section for each browser is collected and joined at the end
+        sections: list[str] = []
 
         # For each URLHistory object, which is assumed to be a single browser,
         # create a new level-3 section and list out the details.
@@ -57,11 +105,8 @@ class URLHistoryRenderer(CASERenderer):
                 continue
 
             # Extract facets - we only expect a single facet
-            facet = obj.hasFacet
-
             # If `facets` is a list, take the first element
-            if isinstance(facet, list) and len(facet) > 0:
-                facet = facet[0]
+            facet = first_item(obj.hasFacet)
 
             if not isinstance(facet, URLHistoryFacet):
                 logger.warning(
@@ -74,90 +119,63 @@ class URLHistoryRenderer(CASERenderer):
             app = facet.browserInformation
             browser_name = "\\<unknown\\>"
             if isinstance(app, Application):
-                app_facet = app.hasFacet
-                if isinstance(app_facet, list) and len(app_facet) > 0:
-                    app_facet = app_facet[0]
+                app_facet = first_item(app.hasFacet)
                 if isinstance(app_facet, ApplicationFacet):
-                    browser_name = (
-                        app_facet.applicationIdentifier
-                        if app_facet.applicationIdentifier
-                        else "\\<unknown\\>"
-                    )
+                    browser_name = app_facet.applicationIdentifier or browser_name
 
             logger.info(f"Parsing URLHistory object for {browser_name=}")
-            result += f"### Browser: {browser_name} ({idx})\n\n"
 
             if not facet.urlHistoryEntry:
-                result += "No URL history entries found.\n\n"
+                sections.append(
+                    _BROWSER_SECTION_TEMPLATE.format(
+                        browser_name=browser_name,
+                        idx=idx,
+                        body="No URL history entries found.",
+                    )
+                )
                 continue
 
-            if not isinstance(facet.urlHistoryEntry, list):
-                facet.urlHistoryEntry = [facet.urlHistoryEntry]
+            entries = facet.urlHistoryEntry
+            if not isinstance(entries, list):
+                entries = [entries]
 
             # Now start extracting individual URLHistoryEntries, store in a table
-            logger.info(f"Adding {len(facet.urlHistoryEntry)} entries")
+            logger.info(f"Adding {len(entries)} entries")
             headers = ["Title", "Last accessed", "Visit count"]
             data: list[list[Any]] = []
-            for history_entry in facet.urlHistoryEntry:
-                if not isinstance(history_entry, URLHistoryEntry):
-                    logger.warning(
-                        f"Entry {history_entry} is not a URLHistoryEntry object, skipping"
-                    )
-                    continue
-
+            for url_facet, history_entry in _iter_valid_entries(entries):
                 # Extract the URL, title, last accessed date, and visit count
-                url = history_entry.url
-                if not isinstance(url, URL):
-                    logger.warning(f"URL {url} is not a URL object, skipping")
-                    continue
-
-                if not url.hasFacet:
-                    logger.warning(f"URL {url} has no facets, skipping")
-                    continue
-
-                # Flatten facet if it's a list, we should only have one URLFacet
-                url_facet = url.hasFacet
-                if isinstance(url_facet, list) and len(url_facet) > 0:
-                    url_facet = url_facet[0]
-
-                if not isinstance(url_facet, URLFacet):
-                    logger.warning(
-                        f"Facet {url_facet} is not a URLFacet object, skipping"
-                    )
-                    continue
-
                 url_entry = url_facet.fullValue
-                title = (
-                    history_entry.pageTitle
-                    if history_entry.pageTitle
-                    else "\\<no title\\>"
-                )
+                title, last_visit, visit_count = _ENTRY_FIELDS(history_entry)
+                title = title or "\\<no title\\>"
 
                 url_markdown = f"[{title}]({url_entry})"
 
+                # Same as `strftime("%Y-%m-%dT%H:%M:%S")`, without the format parsing
                 last_accessed = (
-                    history_entry.lastVisit.strftime("%Y-%m-%dT%H:%M:%S")
-                    if history_entry.lastVisit
+                    last_visit.replace(tzinfo=None).isoformat(timespec="seconds")
+                    if last_visit
                     else "?"
                 )
-                visit_count = (
-                    history_entry.visitCount if history_entry.visitCount else "?"
-                )
 
-                data.append([url_markdown, last_accessed, visit_count])
+                data.append([url_markdown, last_accessed, visit_count or "?"])
 
             # Render using tabulate. Pandoc respects *relative* columns widths;
             # if we don't specify a max column width for the URL column, then
             # a really long URL will cause the other columns to be microscopic
             # in size.
-            result += (
-                tabulate(
-                    data,
-                    headers=headers,
-                    tablefmt="grid",
-                    maxcolwidths=[40, None, None],
+            table = tabulate(
+                data,
+                headers=headers,
+                tablefmt="grid",
+                maxcolwidths=[40, None, None],
+            )
+            sections.append(
+                _BROWSER_SECTION_TEMPLATE.format(
+                    browser_name=browser_name, idx=idx, body=table
                 )
-                + "\n\n"
             )
 
-        return result
+        # Sections (including the header) are separated by a blank line; the
+        # trailing empty string keeps a blank line after the last section
+        return "\n\n".join(["## Browser histories", *sections, ""])
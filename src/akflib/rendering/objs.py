@@ -7,9 +7,10 @@ import json
 import logging
 from abc import ABC, abstractmethod
 from collections import defaultdict
+from operator import attrgetter
 from pathlib import Path
 from types import UnionType
-from typing import Any, ClassVar, Iterable, Type, Union, get_args, get_origin
+from typing import Any, Callable, ClassVar, Iterable, Type, Union, get_args, get_origin
 
 from caselib.uco.core import Bundle, UcoObject, UcoThing
 
@@ -24,10 +25,7 @@ def update_index_recursive(obj: UcoObject, akf_bundle: "AKFBundle") -> None:
     #
     # Although akf_bundle.object only takes UcoObjects, our index accepts
     # UcoThings as well.
-    list_fields = get_uco_thing_fields(type(obj))
-
-    for field in list_fields:
-        field_value = getattr(obj, field)
+    for field_value in _get_uco_thing_field_getter(type(obj))(obj):
         if isinstance(field_value, list):
             for item in field_value:
                 update_index_recursive(item, akf_bundle)
@@ -120,14 +118,24 @@ class AKFBundle(Bundle):
         return akf_bundle
 
 
-def get_uco_thing_fields(model_class: Type[UcoThing]) -> list[str]:
+# The result of `get_uco_thing_fields()` for each class it has been called with
+_uco_thing_fields: dict[type, tuple[str, ...]] = {}
+
+
+def get_uco_thing_fields(model_class: Type[UcoThing]) -> tuple[str, ...]:
     """
     Extract all fields from a UcoThing subclass that allows for lists or single
     instances of UcoThing.
 
+    This is called for every object visited when indexing or searching a
+    bundle, but only depends on the class, so results are cached per class.
+
     :param model_class: A UcoThing subclass.
-    :return: A list of field names that allow for lists of UcoThing.
+    :return: A tuple of field names that allow for lists of UcoThing.
     """
+    if (cached := _uco_thing_fields.get(model_class)) is not None:
+        return cached
+
     result = []
     fields = model_class.model_fields
 
@@ -151,7 +159,50 @@ def get_uco_thing_fields(model_class: Type[UcoThing]) -> list[str]:
                     result.append(field_name)
                     break
 
-    return result
+    _uco_thing_fields[model_class] = tuple(result)
+    return _uco_thing_fields[model_class]
+
+
+# The result of `_get_uco_thing_field_getter()` for each class it has been
+# called with
+_uco_thing_field_getters: dict[type, Callable[[Any], tuple[Any, ...]]] = {}
+
+
+def _get_uco_thing_field_getter(
+    model_class: Type[UcoThing],
+) -> Callable[[Any], tuple[Any, ...]]:
+    """
+    Get a function that returns the values of every field of `model_class`
+    found by `get_uco_thing_fields()`, as a tuple.
+
+    This fetches all of the fields of an object in a single call, rather than
+    looking up each field name with `getattr()`. Getters are built once per
+    class.
+
+    :param model_class: A UcoThing subclass.
+    :return: A function accepting an instance of `model_class`.
+    """
+    if (getter := _uco_thing_field_getters.get(model_class)) is None:
+        getter = _uco_thing_field_getters[model_class] = _build_field_getter(
+            get_uco_thing_fields(model_class)
+        )
+    return getter
+
+
+def _build_field_getter(fields: tuple[str, ...]) -> Callable[[Any], tuple[Any, ...]]:
+    """
+    Build a function that returns the values of `fields` of an object, as a
+    tuple.
+    """
+    # `attrgetter` only returns a tuple when given more than one attribute
+    if not fields:
+        return lambda obj: ()
+
+    if len(fields) == 1:
+        getter = attrgetter(fields[0])
+        return lambda obj: (getter(obj),)
+
+    return attrgetter(*fields)
 
 
 def _accepts_uco_thing(annotation: Any) -> bool:
@@ -186,6 +237,18 @@ def _accepts_uco_thing(annotation: Any) -> bool:
     return False
 
 
+def first_item(value: Any) -> Any:
+    """
+    Get the first element of `value` if it's a non-empty list, or `value` itself
+    otherwise.
+
+    UCO properties such as `hasFacet` may hold either a single object or a list
+    of them. Renderers that only expect a single object can use this to take
+    the first one.
+    """
+    return value[0] if value.__class__ is list and value else value
+
+
 class CASERenderer(ABC):
     """
     Abstract base class for all CASE renderers.
@@ -238,33 +301,39 @@ class CASERenderer(ABC):
                 objects.extend(bundle._object_index.get(obj_type, []))
             return objects
 
-        def _extract_objects_recursive(obj: UcoThing) -> list[UcoThing]:
-            r_objects = []
+        # Objects left to visit, in reverse order. The bundle is walked depth-first
+        # with an explicit stack rather than recursively, which avoids a function
+        # call per object (and running into the recursion limit on deep bundles).
+        # Children are pushed in reverse so objects are still extracted in the
+        # same order as a recursive walk.
+        stack: list[UcoThing] = []
+        if isinstance(bundle.object, list):
+            stack.extend(reversed(bundle.object))
+        elif isinstance(bundle.object, UcoThing):
+            stack.append(bundle.object)
+
+        # Checked against all at once with `isinstance()`, rather than one at a
+        # time for every object
+        object_types = tuple(cls.object_types)
+
+        while stack:
+            obj = stack.pop()
 
             # Extract objects of the types declared in `object_types`
-            for obj_type in cls.object_types:
-                if issubclass(type(obj), obj_type) and not obj._is_reference:
-                    logger.debug(f"Extracted object: {obj}")
-                    r_objects.append(obj)
+            if isinstance(obj, object_types) and not obj._is_reference:
+                logger.debug(f"Extracted object: {obj}")
+                objects.append(obj)
 
             # For object types that have fields accepting more UcoThing,
             # extract and process those as well
-            list_fields = get_uco_thing_fields(type(obj))
-            for field in list_fields:
-                field_value = getattr(obj, field)
+            children: list[UcoThing] = []
+            for field_value in _get_uco_thing_field_getter(type(obj))(obj):
                 if isinstance(field_value, list):
-                    for item in field_value:
-                        r_objects.extend(_extract_objects_recursive(item))
+                    children.extend(field_value)
                 elif issubclass(type(field_value), UcoThing):
-                    r_objects.extend(_extract_objects_recursive(field_value))
+                    children.append(field_value)
 
-            return r_objects
-
-        if isinstance(bundle.object, list):
-            for obj in bundle.object:
-                objects.extend(_extract_objects_recursive(obj))
-        elif isinstance(bundle.object, UcoThing):
-            objects.extend(_extract_objects_recursive(bundle.object))
+            stack.extend(reversed(children))
 
         return objects
 
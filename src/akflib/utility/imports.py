@@ -2,22 +2,50 @@
 Utilities for locating and importing modules and packages.
 """
 
+import functools
 import importlib
+import sys
 from typing import Any, Iterable
 
 
+@functools.lru_cache(maxsize=None)
+def cached_import(module_path: str, object_name: str) -> Any:
+    """
+    Import and return an object from a module, caching the result.
+
+    Modules that have already been (fully) imported are taken directly from
+    `sys.modules`, skipping the import machinery altogether.
+
+    Based on Django's `django.utils.module_loading.cached_import`.
+
+    :param module_path: The fully-qualified path of the module to import.
+    :param object_name: The name of the object to get from the module.
+    :raises ImportError: If the module could not be imported.
+    :raises AttributeError: If the module has no such object.
+    """
+    # A module may be present in `sys.modules` but only partially initialized
+    # (e.g. during a circular import), in which case it must go through the
+    # import machinery as usual
+    if not (
+        (module := sys.modules.get(module_path))
+        and (spec := getattr(module, "__spec__", None))
+        and not getattr(spec, "_initializing", False)
+    ):
+        module = importlib.import_module(module_path)
+
+    return getattr(module, object_name)
+
+
 def get_objects_by_name(
     object_paths: Iterable[str],
 ) -> dict[str, Any]:
     """
-    Attempt to import a set of AKFModules identified by their fully-qualified
-    module paths.
-
-    TODO: This doesn't support the `aliases` attribute of modules. It requires
-    fully-qualified module paths. What *should* happen is that we accept the
-    `library` key in the scenario file, preload a bunch of modules and their
-    aliases, and check if a module that can't be found using a fully-qualified name
-    exists in the preloaded modules.
+    Attempt to import a set of objects identified by their fully-qualified
+    paths.
+
+    :param object_paths: The fully-qualified paths of the objects to import,
+        such as `akflib.modules.sample.SampleModule`.
+    :return: A dictionary of each path to the imported object.
     """
     imported_objects = {}
     for path in object_paths:
@@ -26,14 +54,11 @@ def get_objects_by_name(
         object_name = parts[-1]
 
         try:
-            module = importlib.import_module(module_path)
+            akf_module = cached_import(module_path, object_name)
         except ImportError:
             raise ImportError(
                 f"Could not import module {module_path}, is it installed?"
             )
-
-        try:
-            akf_module = getattr(module, object_name)
         except AttributeError:
             raise ImportError(
                 f"Could not import object {object_name} from module {module_path}, is it installed?"